@@ -0,0 +1,141 @@
+# this file contains analytics of a course that are computed in database:
+# participation, attendance streaks and late arrivals of students and turnout
+# of meetings. the dashboard gets these few numbers instead of the whole
+# history of attendances.
+
+from peewee import JOIN, SQL, Case, Select, fn
+from model import Attendance, Meeting, Student
+
+
+def _late(grace: int):
+    """Condition of attendances that are more than `grace` minutes late."""
+    return Attendance.timestamp > Meeting.start_timestamp + int(grace) * 60
+
+
+def streaks(meetings: int) -> dict[int, tuple[int, int]]:
+    """
+    Longest and current streak of attended meetings of students by id,
+    `meetings` is count of meetings (number of last one).
+    """
+    # gaps and islands: attended meetings in a row have same `n - row_number`
+    ranked = Meeting.select(
+        Meeting.id,
+        fn.ROW_NUMBER()
+        .over(order_by=[Meeting.date, Meeting.start_at, Meeting.id])
+        .alias("n"),
+    ).cte("ranked")
+    present = (
+        Attendance.select(
+            Attendance.student.alias("student_id"),
+            ranked.c.n,
+            (
+                ranked.c.n
+                - fn.ROW_NUMBER().over(
+                    partition_by=[Attendance.student], order_by=[ranked.c.n]
+                )
+            ).alias("island"),
+        )
+        .join(ranked, on=(Attendance.meeting == ranked.c.id))
+        .cte("present")
+    )
+    islands = (
+        Select(
+            [present],
+            [
+                present.c.student_id,
+                fn.COUNT(SQL("*")).alias("length"),
+                fn.MAX(present.c.n).alias("last"),
+            ],
+        )
+        .group_by(present.c.student_id, present.c.island)
+        .cte("islands")
+    )
+    query = (
+        Select(
+            [islands],
+            [
+                islands.c.student_id,
+                fn.MAX(islands.c.length),
+                fn.MAX(Case(None, [(islands.c.last == meetings, islands.c.length)], 0)),
+            ],
+        )
+        .group_by(islands.c.student_id)
+        .with_cte(ranked, present, islands)
+        .bind(Meeting._meta.database)  # type: ignore
+    )
+    return {
+        student_id: (longest, current)
+        for student_id, longest, current in query.tuples()
+    }
+
+
+def students(grace: int = 10) -> list[dict]:
+    """Participation, streaks and late arrivals of each student."""
+    meetings = Meeting.select().count()
+    query = (
+        Student.select(
+            Student.id,
+            Student.name,
+            Student.number,
+            fn.COUNT(Attendance.id),
+            fn.COUNT(Case(None, [(_late(grace), 1)])),
+        )
+        .join(Attendance, JOIN.LEFT_OUTER)
+        .join(Meeting, JOIN.LEFT_OUTER)
+        .group_by(Student.id)
+        .order_by(Student.id)
+        .tuples()
+    )
+    runs = streaks(meetings)
+    return [
+        {
+            "id": student_id,
+            "name": name,
+            "number": number,
+            "attendances": attendances,
+            "absences": meetings - attendances,
+            "participation": (
+                round(attendances / meetings * 100, 1) if meetings else 0
+            ),
+            "late": late,
+            "longest_streak": runs.get(student_id, (0, 0))[0],
+            "current_streak": runs.get(student_id, (0, 0))[1],
+        }
+        for student_id, name, number, attendances, late in query
+    ]
+
+
+def meetings(grace: int = 10) -> list[dict]:
+    """Turnout and late arrivals of each meeting."""
+    count = Student.select().count()
+    query = (
+        Meeting.select(
+            Meeting.id,
+            Meeting.date,
+            Meeting.start_at,
+            Meeting.in_progress,
+            fn.COUNT(Attendance.id).alias("attendances"),
+            fn.COUNT(Case(None, [(_late(grace), 1)])).alias("late"),
+            fn.MIN(Attendance.time).alias("first_arrival"),
+            fn.MAX(Attendance.time).alias("last_arrival"),
+        )
+        .join(Attendance, JOIN.LEFT_OUTER)
+        .group_by(Meeting.id)
+        .order_by(Meeting.id)
+        .dicts()
+    )
+    result = list(query)
+    for meeting in result:
+        meeting["turnout"] = (
+            round(meeting["attendances"] / count * 100, 1) if count else 0
+        )
+    return result
+
+
+def analytics(grace: int = 10) -> dict:
+    """Analytics of students and meetings, late means `grace` minutes after start."""
+    return {
+        "late_after": grace,
+        "students": students(grace),
+        "meetings": meetings(grace),
+    }
@@ -0,0 +1,112 @@
+# this file contains the anomaly report of devices, patterns of proxy
+# attendance are found with grouped queries over indexed foreign keys.
+# each meeting is analyzed once when it is closed and its findings are
+# stored, so the report doesn't scan all attendances.
+
+from peewee import fn
+from model import database_proxy, Anomaly, Attendance, Device, Meeting
+
+SHARED_DEVICE = "shared_device"  # a device checked in several students
+FOREIGN_DEVICE = "foreign_device"  # a device checked in someone except its owner
+BLOCKED_DEVICE = "blocked_device"  # a blocked device checked in
+MANY_DEVICES = "many_devices"  # a student registered several devices
+
+
+def analyze(meeting: Meeting) -> int:
+    """Find anomalies of `meeting` and store them, returns count of them."""
+    students = fn.COUNT(fn.DISTINCT(Attendance.student))
+    shared = (
+        Attendance.select(Attendance.device, students)
+        .where(Attendance.meeting == meeting)  # type: ignore
+        .group_by(Attendance.device)
+        .having(students > 1)
+        .tuples()
+    )
+    rows = [
+        {
+            "kind": SHARED_DEVICE,
+            "meeting": meeting,
+            "device": device,
+            "student": None,
+            "count": count,
+        }
+        for device, count in shared
+    ]
+    others = (
+        Attendance.select(Attendance.device, Attendance.student, Device.blocked)
+        .join(Device)
+        .where(
+            (Attendance.meeting == meeting)  # type: ignore
+            & (
+                Device.student.is_null()  # type: ignore
+                | (Device.student != Attendance.student)  # type: ignore
+                | (Device.blocked == True)  # noqa: E712
+            )
+        )
+        .tuples()
+    )
+    for device, student, blocked in others:
+        kind = BLOCKED_DEVICE if blocked else FOREIGN_DEVICE
+        rows.append(
+            {
+                "kind": kind,
+                "meeting": meeting,
+                "device": device,
+                "student": student,
+                "count": 1,
+            }
+        )
+
+    with database_proxy.atomic():
+        Anomaly.delete().where(Anomaly.meeting == meeting).execute()  # type: ignore
+        if rows:
+            Anomaly.insert_many(rows).execute()
+    return len(rows)
+
+
+def analyze_all() -> int:
+    """Analyze all closed meetings again (e.g. for meetings before this feature)."""
+    meetings = Meeting.select().where(Meeting.in_progress == False)  # noqa: E712
+    return sum(analyze(meeting) for meeting in meetings)
+
+
+def report(min_devices: int = 2) -> dict[str, list[dict]]:
+    """
+    Anomalies of all analyzed meetings per kind, grouped by device and student.
+
+    :param int min_devices: Minimum count of devices of a student to be
+        reported as `MANY_DEVICES`.
+    """
+    result: dict[str, list[dict]] = {
+        SHARED_DEVICE: [],
+        FOREIGN_DEVICE: [],
+        BLOCKED_DEVICE: [],
+        MANY_DEVICES: [],
+    }
+    query = (
+        Anomaly.select(
+            Anomaly.kind,
+            Anomaly.device,
+            Anomaly.student,
+            fn.COUNT(Anomaly.meeting).alias("meetings"),
+            fn.MAX(Anomaly.count).alias("count"),
+            fn.MAX(Anomaly.meeting).alias("last_meeting"),
+        )
+        .group_by(Anomaly.kind, Anomaly.device, Anomaly.student)
+        .order_by(Anomaly.kind, Anomaly.device, Anomaly.student)
+        .dicts()
+    )
+    for row in query:
+        result.setdefault(row.pop("kind"), []).append(row)
+
+    devices = fn.COUNT(Device.id)
+    query = (
+        Device.select(Device.student, devices.alias("count"))
+        .where(Device.student.is_null(False))  # type: ignore
+        .group_by(Device.student)
+        .having(devices >= min_devices)
+        .order_by(Device.student)
+        .dicts()
+    )
+    result[MANY_DEVICES] = list(query)
+    return result
@@ -1,5 +1,8 @@
+from __future__ import annotations
 from flask import (
     Flask,
+    Blueprint,
+    current_app,
     request,
     session,
     render_template,
@@ -8,77 +11,274 @@ from flask import (
     g,
     url_for,
     abort,
+    make_response,
 )
-from flask_session import Session
-from flask_expects_json import expects_json
-from datetime import timedelta, datetime
-from getmac import get_mac_address
-from peewee import DoesNotExist, Database
-from jsonschema import ValidationError
+from flask.cli import with_appcontext
+from datetime import timedelta, datetime, date
+from peewee import DoesNotExist, SqliteDatabase
 from customjsonprovider import CustomJSONProvider
-from playhouse.flask_utils import FlaskDB
-
-from model import database_proxy, Student, Device, Attendance, Score, Meeting, _TABLES_
-from schema import LOGIN_SCHEMA, SCORE_SCHEMA
 
+from model import (
+    database_proxy,
+    Student,
+    Device,
+    Attendance,
+    Score,
+    Meeting,
+    StudentSummary,
+    Job,
+    _TABLES_,
+)
+from schema import (
+    LOGIN_SCHEMA,
+    SCORE_SCHEMA,
+    SCORES_SCHEMA,
+    BLOCK_SCHEMA,
+    JOB_SCHEMA,
+    PROFILE_SCHEMA,
+    ARCHIVE_SCHEMA,
+)
+from validation import expects_json, compile_schemas
+from serializers import serialize
+from cache import present, roster, summaries, computed, ranks
+from courses import load_courses, is_in_memory
+from snapshot import ReadSnapshot
+
+import analytics
+import anomalies
+import changes
+import compression
+import jobs
+import migrations
+import profiler
+import scheduler
+import scopes
+import tokens
 import json
 import functools
+import operator
+import os
+import click
+import schema
+import time
 
 
 Flask.json_provider_class = CustomJSONProvider
-app = Flask(__name__, static_folder=r"templates\assets")
-config: dict = json.load(open("config.json", "r"))
-app.config["DATABASE"] = config["database"]
-app.config["SESSION_PERMANENT"] = True
-app.config["SESSION_TYPE"] = "filesystem"
-app.config["PERMANENT_SESSION_LIFETIME"] = timedelta(hours=2)
-app.config["local admin"] = config.get("local admin", True)
-app.config["admin username"] = config.get("admin username", "kian pirfalak")
-app.config["admin password"] = config.get("admin password", "admin")
-if (
-    app.config["admin username"] == "kian pirfalak"
-    or app.config["admin password"] == "admin"
-):
-    app.logger.warning("Using default username or password for admin.")
-db_wrapper = FlaskDB(app)
-Session(app)
-
-db: Database = db_wrapper.database  # type: ignore
-database_proxy.initialize(db)
-with db:
-    db.create_tables(_TABLES_)
-
-
-@app.before_request
+bp = Blueprint("kian", __name__)
+
+
+def create_app(config: dict | None = None) -> Flask:
+    """
+    Create Kian application.
+
+    :param dict config: Same as content of config.json, it is read from
+        config.json if not given. Use ":memory:" as database url to run with
+        an ephemeral in-memory database.
+    """
+    from flask_session import Session
+
+    if config is None:
+        with open("config.json", "r") as file:
+            config = json.load(file)
+    app = Flask(__name__, static_folder=r"templates\assets")
+    app.config["SESSION_PERMANENT"] = True
+    app.config["SESSION_TYPE"] = "filesystem"
+    app.config["PERMANENT_SESSION_LIFETIME"] = timedelta(hours=2)
+    app.config["local admin"] = config.get("local admin", True)
+    app.config["admin username"] = config.get("admin username", "kian pirfalak")
+    app.config["admin password"] = config.get("admin password", "admin")
+    app.config["archive directory"] = config.get("archive directory", "archives")
+    app.config["export directory"] = config.get("export directory", "exports")
+    app.config["backup directory"] = config.get("backup directory", "backups")
+    app.config["backups to keep"] = config.get("backups to keep", 10)
+    app.config["job workers"] = config.get("job workers", 2)
+    app.config["read snapshot"] = config.get("read snapshot", 0)
+    app.config["late after"] = config.get("late after", 10)
+    app.config["profiles to keep"] = config.get("profiles to keep", 20)
+    app.config["compression level"] = config.get("compression level", 6)
+    app.config["compression min size"] = config.get("compression min size", 1024)
+    app.config["warm up before"] = config.get("warm up before", 5)
+    app.config["checkin tokens"] = config.get("checkin tokens", False)
+    app.config["checkin token lifetime"] = config.get("checkin token lifetime", 120)
+    app.config["secret file"] = config.get("secret file", "kian.secret")
+    app.config["token secret"] = config.get("token secret") or tokens.read_secret(
+        app.config["secret file"]
+    )
+    if app.config["checkin tokens"] and not app.config["token secret"]:
+        app.logger.error(
+            'Check-in tokens are disabled, there is no secret key, run "flask --app app init-db".'
+        )
+        app.config["checkin tokens"] = False
+    if (
+        app.config["admin username"] == "kian pirfalak"
+        or app.config["admin password"] == "admin"
+    ):
+        app.logger.warning("Using default username or password for admin.")
+    Session(app)
+    compile_schemas(schema)
+
+    app.extensions["jobs"] = jobs.JobRunner(app, app.config["job workers"])
+    app.extensions["snapshots"] = {}
+    courses = app.extensions["courses"] = load_courses(config)
+    database_proxy.initialize(next(iter(courses.values())))
+    for name, course_db in courses.items():
+        with database_proxy.routed(course_db), course_db:
+            if is_in_memory(course_db):
+                course_db.create_tables(_TABLES_)
+            elif not all(table.table_exists() for table in _TABLES_):
+                app.logger.warning(
+                    'Database of course "%s" is not initialized, run "flask --app app init-db".',
+                    name,
+                )
+                continue
+            for migration in migrations.migrate(course_db):
+                app.logger.info(
+                    'Migration "%s" applied on course "%s".', migration, name
+                )
+            present.load(Meeting.get_or_none(Meeting.in_progress == True))  # noqa: E712
+            roster.warm()
+            if app.config["checkin tokens"]:
+                tokens.load_revoked()
+            jobs.recover()
+
+    slots = scheduler.parse(config.get("schedule", []), courses)
+    app.extensions["scheduler"] = scheduler.Scheduler(
+        app, slots, app.config["warm up before"] * 60
+    )
+    if slots:
+        app.extensions["scheduler"].start()
+    app.register_blueprint(bp)
+    profiler.install(
+        app,
+        profiler.Profiler(app.config["token secret"], app.config["profiles to keep"]),
+    )
+    if app.config["compression level"]:
+        compression.install(
+            app,
+            compression.Compression(
+                app.config["compression level"], app.config["compression min size"]
+            ),
+        )
+    app.cli.add_command(init_db)
+    return app
+
+
+@click.command("init-db")
+@with_appcontext
+def init_db():
+    """Create tables in databases of all courses."""
+    for name, course_db in current_app.extensions["courses"].items():
+        with database_proxy.routed(course_db), course_db:
+            course_db.create_tables(_TABLES_)
+            migrations.migrate(course_db)
+        click.echo(f'Database of course "{name}" initialized.')
+    if tokens.create_secret(current_app.config["secret file"]):
+        click.echo(f'Secret key created in "{current_app.config["secret file"]}".')
+
+
+def __getattr__(name):
+    # default app is created on first access, so importing this module is cheap
+    if name == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@bp.before_app_request
+def _select_course():
+    courses = current_app.extensions["courses"]
+    default_course = next(iter(courses))
+    course = request.args.get("course") or session.get("course", default_course)
+    if course not in courses:
+        return jsonify(info="course not found." + EASTER_EGG), 404
+    if session.get("course", default_course) != course:
+        # device and student of session belong to database of previous course
+        for key in ("course", "mac", "device", "student"):
+            session.pop(key, None)
+        session["course"] = course
+    if g.get("course") != course:
+        g.pop("meeting", None)
+        g.course = course
+    database_proxy.route(courses[course])
+    database_proxy.connect(reuse_if_open=True)
+
+
+@bp.teardown_app_request
+def _close_database(exc):
+    if not database_proxy.is_closed():
+        database_proxy.close()
+    database_proxy.route(None)
+
+
+def _token_claims() -> tokens.Claims | None:
+    """Claims of valid check-in token of request, if "checkin tokens" is enabled."""
+    if not current_app.config["checkin tokens"]:
+        return None
+    if (token := request.cookies.get(tokens.COOKIE)) is None:
+        return None
+    claims = tokens.verify(
+        current_app.config["token secret"],
+        token,
+        current_app.config["checkin token lifetime"] * 24 * 3600,
+    )
+    if (
+        claims is None
+        or claims.course != g.course
+        or claims.device_id in tokens.revoked
+    ):
+        return None
+    return claims
+
+
+@bp.before_app_request
 def _before_request():
     if "meeting" not in g:
         g.meeting = Meeting.get_or_none(Meeting.in_progress == True)  # noqa: E712
+        present.ensure(g.meeting)
 
+    # a device with a valid token needs neither its session nor its mac address
+    g.token = _token_claims()
+    if g.token is not None:
+        g.device = g.token.device()
+        return
     if "mac" not in session:
-        if request.remote_addr in ("localhost", "127.0.0.1") or app.testing:
+        if request.remote_addr in ("localhost", "127.0.0.1") or current_app.testing:
             mac = "local"
         else:
+            from getmac import get_mac_address
+
             mac = get_mac_address(ip=request.remote_addr)
-        device, created = Device.get_or_create(mac=mac)
-        if created:
-            device.save()
         session["mac"] = mac
-        session["device"] = device
-
-
-@app.errorhandler(400)
-def bad_request(error):
-    if isinstance(error.description, ValidationError):
-        return jsonify(), 400
-    return error
+        session["device"] = roster.device(mac)
+    g.device = session["device"]
+
+
+@bp.after_app_request
+def _issue_token(response):
+    if (
+        current_app.config["checkin tokens"]
+        and g.get("token", False) is None
+        and (device := g.get("device")) is not None
+        and device.student_id is not None
+        and not roster.device(device.mac).blocked
+    ):
+        response.set_cookie(
+            tokens.COOKIE,
+            tokens.issue(current_app.config["token secret"], g.course, device),
+            max_age=current_app.config["checkin token lifetime"] * 24 * 3600,
+            httponly=True,
+            samesite="Lax",
+        )
+    return response
 
 
-@app.route("/")
+@bp.route("/")
 def index():
-    if session["mac"] == "local" and not (app.testing or app.debug):
+    if g.device.mac == "local" and not (current_app.testing or current_app.debug):
         return redirect("admin")
     return render_template(
-        "students.html", registered=(session["device"].student is not None)
+        "students.html", registered=(g.device.student_id is not None)
     )
 
 
@@ -86,14 +286,18 @@ def index():
 EASTER_EGG = " EASTER EGG: I'm so happy that you are reading this! good luck and hack the planet! BSimjoo ;-)"
 
 
-@app.route("/api/v1/register")
+@bp.route("/api/v1/register")
 def register_device():
-    device = session["device"]
+    device = g.device
+    if roster.device(device.mac).blocked:
+        return jsonify(info="device is blocked." + EASTER_EGG), 423
     if (student := device.student) is None:  # device is not registered
         if not (std_num := request.args.get("std_num")) in (None, ""):
-            if (student := Student.get_or_none(Student.number == std_num)) is not None:
+            if (student := roster.student(std_num)) is not None:
                 device.student = student
                 device.save()
+                roster.put_device(device)
+                summaries.invalidate(student.id)
                 session["student"] = student
                 return jsonify(name=student.name)
             else:  # student not existed
@@ -114,34 +318,41 @@ def register_device():
         )
 
 
-@app.route("/api/v1/whoami")
+@bp.route("/api/v1/whoami")
 def whoami():
-    device = session["device"]
+    device = g.device
     if (student := device.student) is not None:
         return jsonify(name=student.name, number=student.number)
     abort(400)
 
 
-@app.route("/api/v1/attendance")
+@bp.route("/api/v1/courses")
+def get_courses():
+    return jsonify(courses=list(current_app.extensions["courses"]), current=g.course)
+
+
+@bp.route("/api/v1/attendance")
 def attendance():
     if g.meeting is not None:
-        device = session.get("device")
-        if (student := device.student) is not None:  # type: ignore
-            query = (
-                g.meeting.attendances.select()
-                .join(Student, on=Attendance.student == Student.id)  # type: ignore
-                .where(Student.id == student.id)  # type: ignore
-            )
+        device = g.device
+        if roster.device(device.mac).blocked:
+            return jsonify(info="device is blocked." + EASTER_EGG), 423
+        # just the id, so student is not read from database
+        if (student_id := device.student_id) is not None:
             code = 200
-            res = {}
-            if query.count() != 0:
-                code = 203
+            if present.add(student_id):
+                try:
+                    Attendance.create(
+                        student=student_id, device=device, meeting=g.meeting
+                    )
+                except Exception:
+                    present.discard(student_id)
+                    raise
+                summaries.invalidate(student_id)
             else:
-                Attendance.create(
-                    student=student, device=device, meeting=g.meeting
-                ).save()
+                code = 203
             res = {
-                "student": student.to_dict(max_depth=1),
+                "student": summaries.student(student_id),
                 "meetings": list(Meeting.select().dicts()),
             }
             return jsonify(res), code
@@ -151,18 +362,18 @@ def attendance():
         return jsonify(info="session did not started yet." + EASTER_EGG), 404
 
 
-@app.route("/admin")
+@bp.route("/admin")
 def admin():
-    if app.config.get("admin from localhost", True):
+    if current_app.config.get("admin from localhost", True):
         if request.remote_addr not in ["localhost", "127.0.0.1"]:
             return redirect("/")
     return render_template("admin.html", admin=session.get("admin", False))
 
 
-@app.route("/api/v1/login", methods=["POST"])
+@bp.route("/api/v1/login", methods=["POST"])
 @expects_json(LOGIN_SCHEMA)
 def login():
-    if app.config.get("local admin", True):
+    if current_app.config.get("local admin", True):
         if request.remote_addr not in ["localhost", "127.0.0.1"]:
             return redirect("/")
     if session.get("admin"):
@@ -171,7 +382,10 @@ def login():
         username = g.data["username"]
         password = g.data["password"]
         if username and password:
-            if (app.config["admin username"], app.config["admin password"]) == (
+            if (
+                current_app.config["admin username"],
+                current_app.config["admin password"],
+            ) == (
                 username,
                 password,
             ):
@@ -191,9 +405,9 @@ def login():
         return jsonify(info="you are banned." + EASTER_EGG), 403
 
 
-@app.route("/api/v1/can_login")
+@bp.route("/api/v1/can_login")
 def can_login():
-    if app.config.get("local admin", True):
+    if current_app.config.get("local admin", True):
         if request.remote_addr not in ["localhost", "127.0.0.1"]:
             abort(403)
     if session.get("tries_left", 5) <= 0:
@@ -204,101 +418,299 @@ def can_login():
 def login_required(func):
     @functools.wraps(func)
     def wrapper(*args, **kw):
-        if app.config.get("local admin", True):
+        if current_app.config.get("local admin", True):
             if request.remote_addr not in ["localhost", "127.0.0.1"]:
                 return redirect("/")
         if session.get("admin"):
             return func(*args, **kw)
-        return redirect(url_for("login"))
+        return redirect(url_for(".login"))
+
+    return wrapper
+
+
+def read_snapshot(func):
+    """
+    Serve a heavy read of admin from a read snapshot of database, if "read
+    snapshot" (max age of snapshot in seconds) is set in config.json.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kw):
+        max_age = current_app.config["read snapshot"]
+        if not max_age or not isinstance(database_proxy.current, SqliteDatabase):
+            return func(*args, **kw)
+        snapshots = current_app.extensions["snapshots"]
+        if (snapshot := snapshots.get(g.course)) is None:
+            snapshot = snapshots.setdefault(g.course, ReadSnapshot(max_age))
+        database = snapshot.get(database_proxy.current)  # type: ignore
+        with database_proxy.routed(database), database.connection_context():
+            return func(*args, **kw)
 
     return wrapper
 
 
-@app.route("/api/v1/students")
+def cached_response(func):
+    """
+    Keep body of response until next write to database, along with its
+    compressed bodies (see compression.py). just for 200 responses that
+    depend on url and database.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kw):
+        g.cached_response = computed.get_or_compute(
+            ("response", request.full_path),
+            lambda: {"body": func(*args, **kw).get_data()},
+        )
+        return current_app.response_class(
+            g.cached_response["body"], mimetype="application/json"
+        )
+
+    return wrapper
+
+
+# maximum count of ids in a batch lookup
+BATCH_SIZE = 500
+
+
+def batch(model):
+    """
+    Response of rows of `model` with ids of "ids" argument (comma separated)
+    in one query, missing rows or rows out of scope of user are left out.
+    """
+    try:
+        ids = {int(i) for i in request.args.get("ids", "").split(",") if i}
+    except ValueError:
+        return jsonify(info="ids must be comma separated integers."), 400
+    if not 0 < len(ids) <= BATCH_SIZE:
+        return jsonify(info=f"1 to {BATCH_SIZE} ids are needed."), 400
+    try:
+        where = scopes.scoped(model, model.id.in_(ids))
+    except PermissionError:
+        return jsonify(info="You're not authorized, login as admin!" + EASTER_EGG), 401
+    return jsonify(serialize(model, where))
+
+
+def get_or_abort(model, row_id: int, unauthorized: str):
+    """
+    Serialized row of `model` with `row_id` in scope of user (see scopes.py),
+    aborts with 404 for admin if not existed or with 401 for others.
+    """
+    try:
+        row = scopes.get(model, row_id)
+    except PermissionError:
+        row = None
+    if row is None:
+        if session.get("admin"):
+            abort(404)
+        abort(make_response(jsonify(info=unauthorized + EASTER_EGG), 401))
+    return row
+
+
+@bp.route("/api/v1/students")
 @login_required
+@read_snapshot
 def get_students():
-    return jsonify([std.to_dict(max_depth=1) for std in Student.select()])
+    return jsonify(serialize(Student))
 
 
-@app.route("/api/v1/students/<int:student_id>")
-def get_student(student_id):
-    if session.get("admin") or (
-        (std := session.get("student")) and std.id == student_id
+@bp.route("/api/v1/students/batch")
+def get_students_batch():
+    return batch(Student)
+
+
+@bp.route("/api/v1/students/import", methods=["POST"])
+@login_required
+def import_students():
+    from importer import validate_range_input
+    import tempfile
+
+    file = request.files.get("file")
+    extension = os.path.splitext(file.filename or "")[1].lower() if file else ""
+    if extension not in (".xlsx", ".csv"):
+        return jsonify(info="an xlsx or csv file is needed."), 400
+    names, numbers = request.form.get("names", ""), request.form.get("numbers", "")
+    if not (
+        validate_range_input.fullmatch(names)
+        and validate_range_input.fullmatch(numbers)
     ):
-        if (student := Student.get_or_none(Student.id == student_id)) is not None:  # type: ignore
-            return jsonify(student.to_dict(max_depth=1))  # type: ignore
+        return jsonify(info="names and numbers must be ranges like A1:A12."), 400
+    fd, path = tempfile.mkstemp(suffix=extension, prefix="kian-import-")
+    with os.fdopen(fd, "wb") as temp:
+        file.save(temp)  # type: ignore
+    params = {"path": path, "names": names, "numbers": numbers}
+    if sheet := request.form.get("sheet"):
+        params["sheet"] = sheet
+    job = current_app.extensions["jobs"].submit("import", params, g.course)
+    return jsonify(job.to_dict(recurse=False)), 202
+
+
+@bp.route("/api/v1/students/<int:student_id>")
+def get_student(student_id):
+    # students are in scope of themselves, it needs no query
+    if not session.get("admin") and scopes.student_id() != student_id:
+        return (
+            jsonify(
+                info="You're not authorized, get your info or login as admin!"
+                + EASTER_EGG
+            ),
+            401,
+        )
+    if (student := summaries.student(student_id)) is not None:
+        return jsonify(student)
+    abort(404)
+
+
+@bp.route("/api/v1/students/<int:student_id>/rank")
+def get_student_rank(student_id):
+    if not session.get("admin") and scopes.student_id() != student_id:
+        return (
+            jsonify(
+                info="You're not authorized, get your rank or login as admin!"
+                + EASTER_EGG
+            ),
+            401,
+        )
+    ranking = ranks.ranking()
+    if (row := ranking["id"].get(student_id)) is None:
         abort(404)
-    return (
-        jsonify(
-            info="You're not authorized, get your info or login as admin!" + EASTER_EGG
-        ),
-        401,
-    )
+    return jsonify(row | {"students": len(ranking["total"])})
 
 
-@app.route("/api/v1/attendances")
+@bp.route("/api/v1/leaderboard")
 @login_required
+def get_leaderboard():
+    if (by := request.args.get("by", "total")) not in ("total", "normalized"):
+        return jsonify(info='by must be "total" or "normalized".'), 400
+    rows = ranks.ranking()[by]
+    limit = max(request.args.get("limit", 10, type=int), 0)
+    return jsonify(by=by, students=len(rows), leaders=rows[:limit])
+
+
+@bp.route("/api/v1/attendances")
+@login_required
+@read_snapshot
 def get_attendances():
-    return jsonify([a.to_dict(max_depth=1) for a in Attendance.select()])
+    # iso dates or times, `until` is exclusive
+    since, until = request.args.get("since"), request.args.get("until")
+    conditions = []
+    try:
+        if since is not None:
+            moment = datetime.fromisoformat(since).timestamp()
+            conditions.append(Attendance.timestamp >= moment)
+        if until is not None:
+            moment = datetime.fromisoformat(until).timestamp()
+            conditions.append(Attendance.timestamp < moment)
+    except ValueError:
+        return jsonify(info="since and until must be iso dates or times."), 400
+    where = functools.reduce(operator.and_, conditions) if conditions else None
+    return jsonify(serialize(Attendance, where))
+
+
+@bp.route("/api/v1/attendances/batch")
+def get_attendances_batch():
+    return batch(Attendance)
 
 
-@app.route("/api/v1/attendances/<int:attendance_id>")
+@bp.route("/api/v1/attendances/<int:attendance_id>")
 def get_attendance(attendance_id):
-    if session.get("admin") or (
-        (std := session.get("student"))
-        and std.attendances.select(
-            Attendance.id == attendance_id  # type:ignore
-        ).count()
-        == 1
-    ):
-        if (a := Attendance.get_or_none(Attendance.id == attendance_id)) is not None:  # type: ignore
-            return jsonify(a.to_dict(max_depth=1))
-        abort(404)
-    return (
-        jsonify(
-            info="You're not authorized, get your attendance info or login as admin!"
-            + EASTER_EGG
-        ),
-        401,
+    attendance = get_or_abort(
+        Attendance,
+        attendance_id,
+        "You're not authorized, get your attendance info or login as admin!",
     )
+    return jsonify(attendance)
 
 
-@app.route("/api/v1/devices")
+@bp.route("/api/v1/devices")
 @login_required
+@read_snapshot
 def get_devices():
-    return jsonify([device.to_dict(max_depth=1) for device in Device.select()])
+    return jsonify(serialize(Device))
+
 
+@bp.route("/api/v1/devices/batch")
+def get_devices_batch():
+    return batch(Device)
 
-@app.route("/api/v1/devices/<int:device_id>")
+
+@bp.route("/api/v1/devices/<int:device_id>")
 def get_device(device_id):
-    if session.get("admin") or (
-        (std := session.get("student")) and std.devices.select(Device.id == device_id).count() == 1  # type: ignore
-    ):
-        if (device := Device.get_or_none(Device.id == device_id)) is not None:  # type: ignore
-            return jsonify(device.to_dict(max_depth=1))
-        abort(404)
-    return (
-        jsonify(
-            info="You're not authorized, get your device or login as admin!"
-            + EASTER_EGG
-        ),
-        401,
+    device = get_or_abort(
+        Device, device_id, "You're not authorized, get your device or login as admin!"
     )
+    return jsonify(device)
+
+
+@bp.route("/api/v1/devices/<int:device_id>/block", methods=["POST"])
+@login_required
+@expects_json(BLOCK_SCHEMA)
+def block_device(device_id):
+    if (device := Device.get_or_none(Device.id == device_id)) is None:  # type: ignore
+        abort(404)
+    device.blocked = g.data["blocked"]
+    device.save()
+    roster.put_device(device)
+    if device.student_id is not None:  # devices are in dict of their student
+        summaries.invalidate(device.student_id)
+    if device.blocked:
+        tokens.revoked.add(device.id)
+    else:
+        tokens.revoked.discard(device.id)
+    return jsonify(device.to_dict(max_depth=1))
 
 
-@app.route("/api/v1/current_meeting")
+@bp.route("/api/v1/anomalies")
+@login_required
+@read_snapshot
+def get_anomalies():
+    return jsonify(anomalies.report(request.args.get("min_devices", 2, type=int)))
+
+
+@bp.route("/api/v1/anomalies", methods=["POST"])
+@login_required
+def analyze_anomalies():
+    anomalies.analyze_all()
+    return jsonify(anomalies.report(request.args.get("min_devices", 2, type=int)))
+
+
+@bp.route("/api/v1/analytics")
+@login_required
+@cached_response
+def get_analytics():
+    grace = request.args.get("late_after", current_app.config["late after"], type=int)
+    return jsonify(analytics.analytics(grace))
+
+
+@bp.route("/api/v1/current_meeting")
 @login_required
 def get_current_meeting():
     if g.meeting is not None and g.meeting.in_progress:
-        return jsonify(g.meeting.to_dict(max_depth=1))
+        return jsonify(
+            g.meeting.to_dict(
+                max_depth=1, update={"count_of_attendances": len(present)}
+            )
+        )
     return jsonify(info="no in progress meeting"), 404
 
 
-@app.route("/api/v1/current_meeting", methods=["POST"])
+@bp.route("/api/v1/current_meeting/absents")
+@login_required
+def get_absents():
+    if g.meeting is not None and g.meeting.in_progress:
+        students = Student.select(Student.id, Student.name, Student.number).dicts()
+        return jsonify(
+            count_of_attendances=len(present),
+            absents=[std for std in students if std["id"] not in present],
+        )
+    return jsonify(info="no in progress meeting"), 404
+
+
+@bp.route("/api/v1/current_meeting", methods=["POST"])
 @login_required
 def start_meeting():
     if g.meeting is None or not g.meeting.in_progress:
-        g.meeting = Meeting.create()
+        g.meeting = scheduler.open_meeting()
     else:
         return jsonify(info="a meeting is already in progress"), 202
     if g.meeting.save() == 1:
@@ -306,25 +718,49 @@ def start_meeting():
     return jsonify(info="Unknown error while creating database record"), 500
 
 
-@app.route("/api/v1/current_meeting", methods=["DELETE"])
+@bp.route("/api/v1/current_meeting", methods=["DELETE"])
 @login_required
 def end_current_meeting():
     if g.meeting is not None and g.meeting.in_progress:
-        g.meeting.in_progress = False
-        g.meeting.end_at = datetime.now().time()
-        if g.meeting.save():
+        if scheduler.close_meeting(g.meeting):
             return jsonify(g.meeting.to_dict(max_depth=1))
         return jsonify(info="Unknown error while saving database record"), 500
     return jsonify(info="no in progress meeting"), 404
 
 
-@app.route("/api/v1/meetings")
+@bp.route("/api/v1/changes")
 @login_required
+def get_changes():
+    if not changes.triggers(database_proxy.current):  # type: ignore
+        return jsonify(info="change log is just supported on sqlite databases."), 501
+    seq = changes.latest()
+    if (since := request.args.get("since", type=int)) is None:
+        return jsonify(seq=seq)
+    return jsonify(seq=seq, **changes.since(since, seq))
+
+
+@bp.route("/api/v1/schedule")
+@login_required
+def get_schedule():
+    now = datetime.now()
+    return jsonify(
+        warm_up_before=current_app.config["warm up before"],
+        slots=[
+            slot.to_dict(now)
+            for slot in current_app.extensions["scheduler"].slots
+            if slot.course == g.course
+        ],
+    )
+
+
+@bp.route("/api/v1/meetings")
+@login_required
+@read_snapshot
 def get_meetings():
-    return jsonify([meeting.to_dict(max_depth=1) for meeting in Meeting.select()])
+    return jsonify(serialize(Meeting))
 
 
-@app.route("/api/v1/meetings/<int:meeting_id>")
+@bp.route("/api/v1/meetings/<int:meeting_id>")
 @login_required
 def get_meeting(meeting_id: int):
     if (meet := Meeting.get_or_none(Meeting.id == meeting_id)) is not None:  # type: ignore
@@ -333,7 +769,7 @@ def get_meeting(meeting_id: int):
 
 
 # TODO: add delete meeting feature. this method didn't used in front-end
-# @app.route("/api/v1/meetings/<int:meeting_id>", methods=["DEL"])
+# @bp.route("/api/v1/meetings/<int:meeting_id>", methods=["DEL"])
 # @login_required
 # def del_meetings(meeting_id: int):
 #     if (meet := Meeting.get_or_none(Meeting.id == meeting_id)) is not None:  # type: ignore
@@ -345,27 +781,214 @@ def get_meeting(meeting_id: int):
 #     abort(404)
 
 
-@app.route("/api/v1/score", methods=["POST"])
+@bp.route("/api/v1/score", methods=["POST"])
 @login_required
 @expects_json(SCORE_SCHEMA)
 def add_edit_score():
     try:
-        student = Student.get_by_id(g.data["student"])
-        meeting = g.data.get("meeting") and Meeting.get_by_id(g.data["meeting"])
-        score = g.data.get("id") and Score.get_by_id(g.data["id"])
+        score = _score_from(g.data)
     except DoesNotExist:
         abort(404)
-    if score:
-        score.score = g.data["score"]
-        score.full_score = g.data.get("full_score", 0)
-        score.reason = g.data.get("reason")
-    else:
-        score = Score.create(
-            student=student,
-            score=g.data["score"],
-            full_score=g.data.get("full_score", 0),
-            meeting=meeting,
-            reason=g.data.get("reason"),
-        )
     res = score.save()
+    summaries.invalidate(score.student_id)
+    ranks.invalidate()
     return jsonify(score.to_dict()), 200 if res == 1 else 500
+
+
+@bp.route("/api/v1/scores", methods=["POST"])
+@login_required
+@expects_json(SCORES_SCHEMA)
+def add_edit_scores():
+    try:
+        with database_proxy.atomic():
+            scores = [_score_from(data) for data in g.data]
+            for score in scores:
+                score.save()
+    except DoesNotExist:
+        abort(404)
+    for score in scores:
+        summaries.invalidate(score.student_id)
+    ranks.invalidate()
+    return jsonify([score.to_dict() for score in scores])
+
+
+def _score_from(data: dict) -> Score:
+    """Edited or new (not saved) Score from request data."""
+    student = Student.get_by_id(data["student"])
+    meeting = data.get("meeting") and Meeting.get_by_id(data["meeting"])
+    if score := data.get("id") and Score.get_by_id(data["id"]):
+        score.score = data["score"]
+        score.full_score = data.get("full_score", 0)
+        score.reason = data.get("reason")
+        return score
+    return Score(
+        student=student,
+        score=data["score"],
+        full_score=data.get("full_score", 0),
+        meeting=meeting,
+        reason=data.get("reason"),
+    )
+
+
+@bp.route("/api/v1/archive")
+@login_required
+@read_snapshot
+def get_archive_summaries():
+    return jsonify([s.to_dict(recurse=False) for s in StudentSummary.select()])
+
+
+@bp.route("/api/v1/archive", methods=["POST"])
+@login_required
+@expects_json(ARCHIVE_SCHEMA)
+def archive_meetings():
+    try:
+        before = date.fromisoformat(g.data["before"])
+    except ValueError:
+        abort(400)
+    path = os.path.join(
+        current_app.config["archive directory"], f"{g.course}-{before}.sqlite"
+    )
+    if os.path.exists(path):
+        return jsonify(info="archive already existed."), 409
+    # copying and vacuum of live database are slow, see "archive" job
+    job = current_app.extensions["jobs"].submit(
+        "archive", {"before": before.isoformat()}, g.course
+    )
+    return jsonify(job.to_dict(recurse=False)), 202
+
+
+@bp.route("/api/v1/backups")
+@login_required
+def get_backups():
+    from backup import snapshots
+
+    directory = current_app.config["backup directory"]
+    result = []
+    for name in snapshots(directory, g.course):
+        stat = os.stat(os.path.join(directory, name))
+        result.append(
+            {
+                "name": name,
+                "size": stat.st_size,
+                "time": datetime.fromtimestamp(stat.st_mtime),
+            }
+        )
+    return jsonify(result)
+
+
+@bp.route("/api/v1/backups", methods=["POST"])
+@login_required
+def take_backup():
+    job = current_app.extensions["jobs"].submit("backup", course=g.course)
+    return jsonify(job.to_dict(recurse=False)), 202
+
+
+@bp.route("/api/v1/jobs")
+@login_required
+def get_jobs():
+    query = Job.select().order_by(Job.id.desc()).limit(50)  # type: ignore
+    return jsonify([job.to_dict(recurse=False) for job in query])
+
+
+@bp.route("/api/v1/jobs", methods=["POST"])
+@login_required
+@expects_json(JOB_SCHEMA)
+def submit_job():
+    kinds = [kind for kind in jobs.KINDS if kind not in jobs.INTERNAL]
+    if g.data["kind"] not in kinds:
+        return jsonify(info="unknown kind of job.", kinds=kinds), 400
+    job = current_app.extensions["jobs"].submit(
+        g.data["kind"], g.data.get("params"), g.course
+    )
+    return jsonify(job.to_dict(recurse=False)), 202
+
+
+@bp.route("/api/v1/jobs/<int:job_id>")
+@login_required
+def get_job(job_id):
+    if (job := Job.get_or_none(Job.id == job_id)) is not None:  # type: ignore
+        return jsonify(job.to_dict(recurse=False))
+    abort(404)
+
+
+@bp.route("/api/v1/jobs/<int:job_id>", methods=["DELETE"])
+@login_required
+def cancel_job(job_id):
+    if not Job.select().where(Job.id == job_id).exists():  # type: ignore
+        abort(404)
+    if current_app.extensions["jobs"].cancel(job_id):
+        return jsonify(Job.get_by_id(job_id).to_dict(recurse=False))
+    return jsonify(info="job is already finished."), 409
+
+
+@bp.route("/api/v1/metrics")
+@login_required
+def get_metrics():
+    compressor = current_app.extensions.get("compression")
+    return jsonify(compression=compressor.stats if compressor is not None else None)
+
+
+@bp.route("/api/v1/profiles")
+@login_required
+def get_profiles():
+    profiles = current_app.extensions["profiler"].profiles
+    return jsonify(
+        armed=current_app.extensions["profiler"].armed,
+        profiles=[
+            {
+                key: profile[key]
+                for key in profile
+                if key not in ("queries", "stats", "dump")
+            }
+            | {"queries": len(profile["queries"])}
+            for profile in reversed(profiles)
+        ],
+    )
+
+
+@bp.route("/api/v1/profiles", methods=["POST"])
+@login_required
+@expects_json(PROFILE_SCHEMA)
+def arm_profiler():
+    endpoint = g.data["endpoint"]
+    if endpoint != "*" and endpoint not in current_app.view_functions:
+        return jsonify(info="endpoint not found."), 404
+    current_app.extensions["profiler"].arm(endpoint, g.data.get("count", 1))
+    return jsonify(armed=current_app.extensions["profiler"].armed)
+
+
+@bp.route("/api/v1/profiles/signature")
+@login_required
+def get_profile_signature():
+    if not (path := request.args.get("path")):
+        return jsonify(info="path didn't send."), 400
+    if (key := current_app.extensions["profiler"].key) is None:
+        return (
+            jsonify(info='secret key is not created, run "flask --app app init-db".'),
+            501,
+        )
+    minutes = min(max(request.args.get("minutes", 10, type=int), 1), 24 * 60)
+    expires_at = int(time.time()) + minutes * 60
+    value = profiler.signature(key, path, expires_at)
+    return jsonify(header=profiler.HEADER, value=value, expires_at=expires_at)
+
+
+@bp.route("/api/v1/profiles/<int:profile_id>")
+@login_required
+def get_profile(profile_id):
+    if (profile := current_app.extensions["profiler"].get(profile_id)) is None:
+        abort(404)
+    return jsonify({key: value for key, value in profile.items() if key != "dump"})
+
+
+@bp.route("/api/v1/profiles/<int:profile_id>/download")
+@login_required
+def download_profile(profile_id):
+    if (profile := current_app.extensions["profiler"].get(profile_id)) is None:
+        abort(404)
+    response = make_response(profile["dump"])
+    response.content_type = "application/octet-stream"
+    response.headers[
+        "Content-Disposition"
+    ] = f"attachment; filename=profile-{profile_id}.prof"
+    return response
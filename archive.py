@@ -0,0 +1,136 @@
+# this file contains archiving of closed meetings. meetings of a finished
+# semester with their attendances and scores move to a read-only archive
+# database and just a compact summary per student stays in live database.
+
+from __future__ import annotations
+from datetime import date
+from typing import Callable
+from peewee import fn, chunked, EXCLUDED
+from playhouse.db_url import connect
+from model import (
+    database_proxy,
+    Meeting,
+    Anomaly,
+    Student,
+    Device,
+    Attendance,
+    Score,
+    StudentSummary,
+    _TABLES_,
+)
+
+import os
+import stat
+
+
+def archive(
+    before: date, path: str, progress: Callable[[int, int], None] | None = None
+) -> dict[str, int]:
+    """
+    Move closed meetings before `before` with their attendances and scores to
+    a new archive database at `path`, then compact live database.
+
+    :param progress: Called with count of copied rows and count of all rows
+        after each batch, an exception of it stops archiving before live
+        database is changed.
+    :returns: Count of archived rows per table.
+    :raises RuntimeError: If rows of the meetings are written while copying,
+        live database is not changed and archive is removed.
+    """
+    if os.path.exists(path):
+        raise FileExistsError(path)
+    meetings = [
+        meeting_id
+        for meeting_id, in Meeting.select(Meeting.id)
+        .where((Meeting.date < before) & (Meeting.in_progress == False))  # noqa: E712
+        .tuples()
+    ]
+    rows = {
+        Meeting: list(Meeting.select().where(Meeting.id.in_(meetings)).dicts()),  # type: ignore
+        Attendance: list(
+            Attendance.select().where(Attendance.meeting.in_(meetings)).dicts()  # type: ignore
+        ),
+        Score: list(Score.select().where(Score.meeting.in_(meetings)).dicts()),  # type: ignore
+    }
+    result = {model._meta.table_name: len(data) for model, data in rows.items()}  # type: ignore
+    if not meetings:
+        return result
+
+    roster = {
+        Student: list(Student.select().dicts()),
+        Device: list(Device.select().dicts()),
+    }
+    total = sum(map(len, (*roster.values(), *rows.values())))
+    copied = 0
+    archive_db = connect("sqlite:///" + path)
+    try:
+        with database_proxy.routed(archive_db), archive_db:
+            archive_db.create_tables(_TABLES_)
+            for model, data in (*roster.items(), *rows.items()):
+                for batch in chunked(data, 100):
+                    model.insert_many(batch).execute()
+                    copied += len(batch)
+                    if progress is not None:
+                        progress(copied, total)
+    except BaseException:
+        os.remove(path)
+        raise
+    os.chmod(path, stat.S_IREAD | stat.S_IRGRP | stat.S_IROTH)
+
+    # just copied rows are summarized and deleted, rows that are written
+    # meanwhile are not in archive
+    attendances: dict[int, int] = {}
+    for row in rows[Attendance]:
+        attendances[row["student"]] = attendances.get(row["student"], 0) + 1
+    scores: dict[int, tuple[float, float]] = {}
+    for row in rows[Score]:
+        total_score, total_full_score = scores.get(row["student"], (0, 0))
+        scores[row["student"]] = (
+            total_score + row["score"],
+            total_full_score + (row["full_score"] or 0),
+        )
+    try:
+        with database_proxy.atomic():
+            summaries = [
+                {
+                    "student": student_id,
+                    "meetings": len(meetings),
+                    "attendances": attendances.get(student_id, 0),
+                    "total_score": scores.get(student_id, (0, 0))[0],
+                    "total_full_score": scores.get(student_id, (0, 0))[1],
+                }
+                for student_id, in Student.select(Student.id).tuples()
+            ]
+            for batch in chunked(summaries, 100):
+                StudentSummary.insert_many(batch).on_conflict(
+                    conflict_target=[StudentSummary.student],
+                    update={
+                        field: field + getattr(EXCLUDED, field.name)
+                        for field in (
+                            StudentSummary.meetings,
+                            StudentSummary.attendances,
+                            StudentSummary.total_score,
+                            StudentSummary.total_full_score,
+                        )
+                    },
+                ).execute()
+            for model in (Score, Attendance):
+                ids = [row["id"] for row in rows[model]]
+                for batch in chunked(ids, 500):
+                    model.delete().where(model.id.in_(batch)).execute()  # type: ignore
+            if (
+                Attendance.select().where(Attendance.meeting.in_(meetings)).exists()  # type: ignore
+                or Score.select().where(Score.meeting.in_(meetings)).exists()  # type: ignore
+            ):
+                raise RuntimeError("meetings are changed while archiving")
+            Anomaly.delete().where(Anomaly.meeting.in_(meetings)).execute()  # type: ignore
+            Meeting.delete().where(Meeting.id.in_(meetings)).execute()  # type: ignore
+    except BaseException:
+        # live database is rolled back, so archive is not valid
+        os.chmod(path, stat.S_IWRITE | stat.S_IREAD)
+        os.remove(path)
+        raise
+
+    database_proxy.execute_sql("VACUUM")
+    database_proxy.execute_sql("ANALYZE")
+    return result
@@ -0,0 +1,101 @@
+# this file contains online backups of sqlite databases. backups are taken
+# with sqlite's backup api in small steps with a sleep between them, so
+# check-ins of a live meeting can write meanwhile and never wait for it.
+
+from __future__ import annotations
+from datetime import datetime
+from typing import Callable
+from peewee import SqliteDatabase
+from model import database_proxy, _TABLES_
+
+import os
+import re
+import sqlite3
+
+SUFFIX = ".sqlite"
+
+
+def backup(
+    directory: str,
+    name: str,
+    keep: int = 10,
+    pages: int = 64,
+    sleep: float = 0.005,
+    progress: Callable[[int, int], None] | None = None,
+) -> str:
+    """
+    Take a timestamped snapshot of database that models are routed to and
+    remove old snapshots of `name` except last `keep` ones.
+
+    :param int pages: Count of pages to copy in each step.
+    :param float sleep: Seconds to sleep between steps.
+    :param progress: Called with count of copied pages and count of all pages
+        after each step.
+    :returns: Path of snapshot.
+    """
+    database = database_proxy.current
+    if not isinstance(database, SqliteDatabase):
+        raise ValueError("just sqlite databases can be backed up.")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}-{datetime.now():%Y%m%d-%H%M%S}{SUFFIX}")
+    if os.path.exists(path):
+        raise FileExistsError(path)
+
+    def step(status, remaining, total):
+        if progress is not None:
+            progress(total - remaining, total)
+
+    temp = path + ".part"
+    target = sqlite3.connect(temp)
+    try:
+        database.connection().backup(target, pages=pages, progress=step, sleep=sleep)
+        target.close()
+        os.replace(temp, path)
+    except BaseException:
+        target.close()
+        os.remove(temp)
+        raise
+    for old in snapshots(directory, name)[keep:]:
+        os.remove(os.path.join(directory, old))
+    return path
+
+
+def snapshots(directory: str, name: str) -> list[str]:
+    """File names of snapshots of `name`, newest first."""
+    if not os.path.isdir(directory):
+        return []
+    # exact stamp, so "math-2-..." is not a snapshot of "math"
+    pattern = re.compile(re.escape(name) + r"-\d{8}-\d{6}" + re.escape(SUFFIX))
+    return sorted(
+        (file for file in os.listdir(directory) if pattern.fullmatch(file)),
+        reverse=True,
+    )
+
+
+def verify(path: str) -> dict[str, int]:
+    """
+    Restore snapshot at `path` into memory and check its integrity.
+
+    :raises ValueError: If snapshot is corrupted or a table is missing.
+    :returns: Count of rows per table.
+    """
+    source = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    restored = sqlite3.connect(":memory:")
+    try:
+        source.backup(restored)
+        (result,) = restored.execute("PRAGMA integrity_check").fetchone()
+        if result != "ok":
+            raise ValueError(f"snapshot is corrupted: {result}")
+        counts = {}
+        for table in _TABLES_:
+            name = table._meta.table_name  # type: ignore
+            try:
+                (counts[name],) = restored.execute(
+                    f'SELECT COUNT(*) FROM "{name}"'
+                ).fetchone()
+            except sqlite3.OperationalError:
+                raise ValueError(f'table "{name}" is missing in snapshot')
+        return counts
+    finally:
+        source.close()
+        restored.close()
@@ -0,0 +1,83 @@
+# this file compares generated serializers (serializers.py) with
+# `model_to_dict` on a classroom-sized in-memory database.
+# usage: python benchmarks/bench_serializers.py [count of students]
+
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from peewee import SqliteDatabase  # noqa: E402
+from playhouse.shortcuts import model_to_dict  # noqa: E402
+from model import (  # noqa: E402
+    database_proxy,
+    Student,
+    Device,
+    Attendance,
+    Score,
+    Meeting,
+    _TABLES_,
+)
+from serializers import serialize  # noqa: E402
+
+
+def populate(students: int, meetings: int = 16):
+    Student.insert_many(
+        {"name": f"student {i}", "number": f"{i:09}"} for i in range(students)
+    ).execute()
+    Device.insert_many(
+        {"mac": f"{i:012x}", "student": i + 1} for i in range(students)
+    ).execute()
+    Meeting.insert_many({"in_progress": False} for _ in range(meetings)).execute()
+    Attendance.insert_many(
+        {"student": i + 1, "device": i + 1, "meeting": m + 1}
+        for m in range(meetings)
+        for i in range(students)
+        if (i + m) % 4
+    ).execute()
+    Score.insert_many(
+        {"student": i + 1, "score": 1, "full_score": 2, "meeting": m + 1}
+        for m in range(0, meetings, 4)
+        for i in range(students)
+    ).execute()
+
+
+def legacy(model):
+    result = []
+    for obj in model.select():
+        data = model_to_dict(obj, backrefs=True, max_depth=1)
+        data.update(obj.computed())
+        result.append(data)
+    return result
+
+
+def measure(func, model):
+    tracemalloc.start()
+    func(model)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    seconds = min(timeit.repeat(lambda: func(model), number=1, repeat=5))
+    return seconds, peak
+
+
+def main(students: int = 60):
+    db = SqliteDatabase(":memory:")
+    with database_proxy.routed(db):
+        db.create_tables(_TABLES_)
+        populate(students)
+        print(f"{'model':<12}{'legacy':>18}{'generated':>18}{'speedup':>10}")
+        for model in (Student, Meeting, Attendance, Device, Score):
+            assert serialize(model) == legacy(model)
+            (t1, m1), (t2, m2) = measure(legacy, model), measure(serialize, model)
+            print(
+                f"{model.__name__:<12}"
+                f"{t1 * 1000:>9.1f}ms {m1 / 1024:>5.0f}KiB"
+                f"{t2 * 1000:>9.1f}ms {m2 / 1024:>5.0f}KiB"
+                f"{t1 / t2:>9.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
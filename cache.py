@@ -0,0 +1,347 @@
+# this file contains in-memory indexes that keep the check-in path
+# away from database as much as possible. each course (database) has its
+# own instance of indexes.
+
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Callable
+from model import (
+    database_proxy,
+    Attendance,
+    Change,
+    Meeting,
+    Student,
+    Device,
+    StudentSummary,
+)
+from serializers import serializer_for
+
+import changes
+import leaderboard
+import threading
+import time
+
+
+class PresentSet:
+    """Ids of the students that are present in the in-progress meeting."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._students: set[int] = set()
+        self.meeting_id: int | None = None
+
+    def load(self, meeting: Meeting | None):
+        """Load present students of `meeting` from database, `None` clears the set."""
+        students = set()
+        if meeting is not None:
+            query = (
+                Attendance.select(Attendance.student)
+                .where(Attendance.meeting == meeting)  # type: ignore
+                .tuples()
+            )
+            students = {student_id for student_id, in query}
+        with self._lock:
+            self._students = students
+            self.meeting_id = meeting.id if meeting is not None else None  # type: ignore
+
+    def ensure(self, meeting: Meeting | None):
+        """Reload the set if `meeting` is not the loaded one."""
+        if (meeting.id if meeting is not None else None) != self.meeting_id:  # type: ignore
+            self.load(meeting)
+
+    def add(self, student_id: int) -> bool:
+        """Mark student as present, returns `False` if already was present."""
+        with self._lock:
+            if student_id in self._students:
+                return False
+            self._students.add(student_id)
+            return True
+
+    def discard(self, student_id: int):
+        with self._lock:
+            self._students.discard(student_id)
+
+    def missing(self, student_ids) -> list[int]:
+        """Filter `student_ids` to those that are not present."""
+        students = self._students
+        return [student_id for student_id in student_ids if student_id not in students]
+
+    def __contains__(self, student_id) -> bool:
+        return student_id in self._students
+
+    def __len__(self) -> int:
+        return len(self._students)
+
+
+class RosterIndex:
+    """Read-mostly index of students by number and devices by mac address.
+
+    Misses fall back to database. Every `interval` seconds a lookup reads
+    changes of students and devices in change log (see changes.py) after the
+    last seen one and drops their entries, so rows that another process (like
+    `studmgr.py`) writes are read again from database.
+    """
+
+    # minimum seconds between reading change log
+    interval = 2.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._students: dict[str, tuple[int, str]] = {}
+        self._devices: dict[str, dict] = {}
+        self._seq = 0
+        self._refreshed_at = 0.0
+
+    def warm(self):
+        """Load all students and devices from database."""
+        # changes after this are applied on next refresh
+        seq = changes.latest()
+        students = {
+            number: (student_id, name)
+            for student_id, name, number in Student.select(
+                Student.id, Student.name, Student.number
+            ).tuples()
+        }
+        devices = {row["mac"]: row for row in Device.select().dicts()}
+        with self._lock:
+            self._students = students
+            self._devices = devices
+            self._seq = seq
+            self._refreshed_at = time.monotonic()
+
+    def refresh(self):
+        """
+        Drop entries of students and devices that are changed after last
+        refresh, if it is older than `interval`.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._refreshed_at < self.interval:
+                return
+            self._refreshed_at = now
+            seq = self._seq
+        # other changes (like attendances) are skipped by moving to the last one
+        if (latest := changes.latest()) <= seq:
+            return
+        tables = {
+            Student._meta.table_name: set(),  # type: ignore
+            Device._meta.table_name: set(),  # type: ignore
+            "*": set(),
+        }
+        query = Change.select(Change.table_name, Change.row_id).where(
+            (Change.id > seq)
+            & (Change.id <= latest)
+            & Change.table_name.in_(list(tables))  # type: ignore
+        )
+        for table, row_id in query.tuples():
+            tables[table].add(row_id)
+        students = tables[Student._meta.table_name]  # type: ignore
+        devices = tables[Device._meta.table_name]  # type: ignore
+        with self._lock:
+            if tables["*"]:  # tables are replaced
+                self._students, self._devices = {}, {}
+            if students:
+                self._students = {
+                    number: row
+                    for number, row in self._students.items()
+                    if row[0] not in students
+                }
+            if devices:
+                self._devices = {
+                    mac: row
+                    for mac, row in self._devices.items()
+                    if row["id"] not in devices
+                }
+            self._seq = max(self._seq, latest)
+
+    def student(self, number: str) -> Student | None:
+        """Get student by student number."""
+        self.refresh()
+        if (row := self._students.get(number)) is not None:
+            student_id, name = row
+            return Student(id=student_id, name=name, number=number)
+        if (student := Student.get_or_none(Student.number == number)) is not None:
+            self.put_student(student)
+        return student
+
+    def device(self, mac: str) -> Device:
+        """Get device by mac address, creates it if not existed."""
+        self.refresh()
+        if (row := self._devices.get(mac)) is not None:
+            return Device(**row)
+        device, _ = Device.get_or_create(mac=mac)
+        self.put_device(device)
+        return device
+
+    def put_student(self, student: Student):
+        with self._lock:
+            self._students[student.number] = (student.id, student.name)  # type: ignore
+
+    def put_device(self, device: Device):
+        row = {field: device.__data__.get(field) for field in Device._meta.fields}  # type: ignore
+        with self._lock:
+            self._devices[device.mac] = row  # type: ignore
+
+
+class StudentSummaries:
+    """LRU cache of students' dicts (`to_dict(max_depth=1)`) with a summary of
+    their attendances and scores, for students that poll their own data.
+
+    Writes of a student should `invalidate` just that student, starting a
+    meeting changes absences of everyone so it should `clear` the cache.
+    """
+
+    def __init__(self, size: int = 512, last: int = 5):
+        self.size = size
+        self.last = last
+        self._lock = threading.Lock()
+        self._items: OrderedDict[int, dict] = OrderedDict()
+        self._version = 0
+
+    def student(self, student_id: int) -> dict | None:
+        """Dict of student with its summary, `None` if student not existed."""
+        with self._lock:
+            if (data := self._items.get(student_id)) is not None:
+                self._items.move_to_end(student_id)
+                return data
+            version = self._version
+        if (data := self._build(student_id)) is None:
+            return None
+        with self._lock:
+            # don't keep it if something is invalidated while it was building
+            if version == self._version:
+                self._items[student_id] = data
+                if len(self._items) > self.size:
+                    self._items.popitem(last=False)
+        return data
+
+    def invalidate(self, student_id: int):
+        with self._lock:
+            self._items.pop(student_id, None)
+            self._version += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._version += 1
+
+    def _build(self, student_id: int) -> dict | None:
+        result = serializer_for(Student).many(Student.id == student_id)  # type: ignore
+        if not result:
+            return None
+        data = result[0]
+        meetings = Meeting.select().count()
+        attendances = len(data["attendances"])
+        total_score, total_full_score = data["total_score"], data["total_full_score"]
+        archived = StudentSummary.get_or_none(StudentSummary.student == student_id)
+        if archived is not None:
+            meetings += archived.meetings
+            attendances += archived.attendances
+            total_score += archived.total_score
+            total_full_score += archived.total_full_score
+        data["summary"] = {
+            "meetings": meetings,
+            "attendances": attendances,
+            "absences": max(meetings - attendances, 0),
+            "participation": round(attendances / meetings * 100, 1) if meetings else 0,
+            "total_score": total_score,
+            "total_full_score": total_full_score,
+            "last_attendances": data["attendances"][-self.last :],
+        }
+        return data
+
+
+class Leaderboard:
+    """Ranking of students by score (see leaderboard.py), until `invalidate`.
+
+    Writes of scores (and students) should `invalidate` it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ranking: dict | None = None
+        self._version = 0
+
+    def ranking(self) -> dict:
+        """
+        Rows of students ordered by `"total"` and `"normalized"` rank, and by
+        `"id"` of students.
+        """
+        if (ranking := self._ranking) is not None:
+            return ranking
+        version = self._version
+        rows = leaderboard.ranking()
+        ranking = {
+            "total": rows,
+            "normalized": sorted(rows, key=lambda r: (r["normalized_rank"], r["id"])),
+            "id": {row["id"]: row for row in rows},
+        }
+        with self._lock:
+            # don't keep it if something is invalidated while it was computing
+            if version == self._version:
+                self._ranking = ranking
+        return ranking
+
+    def invalidate(self):
+        with self._lock:
+            self._ranking = None
+            self._version += 1
+
+
+class GenerationCache:
+    """
+    LRU cache of values that are computed from database, a value is kept
+    until the next write to database (see `DatabaseRouter.generation`).
+    """
+
+    def __init__(self, size: int = 64):
+        self.size = size
+        self._lock = threading.Lock()
+        self._items: OrderedDict[object, tuple[int, object]] = OrderedDict()
+
+    def get_or_compute(self, key, compute: Callable[[], object]):
+        generation = database_proxy.generation()
+        with self._lock:
+            if (item := self._items.get(key)) is not None and item[0] == generation:
+                self._items.move_to_end(key)
+                return item[1]
+        # if database is written meanwhile, value is kept with old generation
+        value = compute()
+        with self._lock:
+            self._items[key] = (generation, value)
+            self._items.move_to_end(key)
+            if len(self._items) > self.size:
+                self._items.popitem(last=False)
+        return value
+
+
+class PerDatabase:
+    """Keeps an instance of `factory` for each database that models are routed to."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._instances = {}
+
+    def get(self):
+        database = database_proxy.current
+        if (instance := self._instances.get(database)) is None:
+            with self._lock:
+                instance = self._instances.setdefault(database, self._factory())
+        return instance
+
+    def __getattr__(self, attr):
+        return getattr(self.get(), attr)
+
+    def __contains__(self, item) -> bool:
+        return item in self.get()
+
+    def __len__(self) -> int:
+        return len(self.get())
+
+
+present: PresentSet = PerDatabase(PresentSet)  # type: ignore
+roster: RosterIndex = PerDatabase(RosterIndex)  # type: ignore
+summaries: StudentSummaries = PerDatabase(StudentSummaries)  # type: ignore
+computed: GenerationCache = PerDatabase(GenerationCache)  # type: ignore
+ranks: Leaderboard = PerDatabase(Leaderboard)  # type: ignore
@@ -0,0 +1,72 @@
+# this file contains the change log of a course. triggers of sqlite append
+# a row to it for each insert, update or delete of tracked tables, so writes
+# of every process (server, studmgr.py, archiving, ...) are logged in their
+# own transaction. clients that keep a copy of the data ask for changes after
+# the last sequence number that they have seen and get current rows of
+# changed ones, instead of downloading everything again.
+
+from __future__ import annotations
+from collections import defaultdict
+from peewee import Database, SqliteDatabase, chunked, fn
+from model import Attendance, Change, Device, Meeting, Score, Student
+from serializers import serializer_for
+
+TRACKED = (Student, Meeting, Attendance, Score, Device)
+
+RESET = "reset"
+
+
+def triggers(database: Database) -> dict[str, str]:
+    """Sql of triggers of tracked tables by name, just sqlite has them."""
+    if not isinstance(database, SqliteDatabase):
+        return {}
+    result = {}
+    for model in TRACKED:
+        table = model._meta.table_name  # type: ignore
+        for operation, row in (("insert", "NEW"), ("update", "NEW"), ("delete", "OLD")):
+            name = f"{table}_{operation}_change"
+            result[name] = (
+                f'CREATE TRIGGER IF NOT EXISTS "{name}" AFTER {operation.upper()} '
+                f'ON "{table}" BEGIN INSERT INTO "change" '
+                f'("table_name", "row_id", "operation") '
+                f"VALUES ('{table}', {row}.\"id\", '{operation}'); END"
+            )
+    return result
+
+
+def latest() -> int:
+    """Sequence number of last change."""
+    return Change.select(fn.MAX(Change.id)).scalar() or 0
+
+
+def reset():
+    """Log that tables are replaced, clients should load everything again."""
+    Change.create(table_name="*", row_id=0, operation=RESET)
+
+
+def since(seq: int, until: int | None = None) -> dict:
+    """
+    Changes after `seq` (up to `until`), compacted to current rows of changed
+    rows by table and ids of deleted ones. `reset` is true if tables are
+    replaced meanwhile.
+    """
+    query = Change.select(Change.table_name, Change.row_id).where(Change.id > seq)
+    if until is not None:
+        query = query.where(Change.id <= until)
+    ids: dict[str, set[int]] = defaultdict(set)
+    for table, row_id in query.distinct().tuples().iterator():
+        ids[table].add(row_id)
+    if ids.pop("*", None):
+        return {"reset": True, "changed": {}, "deleted": {}}
+    changed, deleted = {}, {}
+    for model in TRACKED:
+        table = model._meta.table_name  # type: ignore
+        if not (row_ids := ids.get(table)):
+            continue
+        rows = []
+        for batch in chunked(sorted(row_ids), 500):
+            rows.extend(serializer_for(model).many(model.id.in_(batch)))
+        changed[table] = rows
+        if missing := row_ids - {row["id"] for row in rows}:
+            deleted[table] = sorted(missing)
+    return {"reset": False, "changed": changed, "deleted": deleted}
@@ -0,0 +1,115 @@
+# this file contains compression of api responses. responses are compressed
+# with brotli (if it is installed) or gzip, as the client accepts. bodies of
+# cached responses are compressed once per encoding (see `cached_response` of
+# app.py), others on each response. small responses are sent as they are.
+
+from __future__ import annotations
+from flask import Flask, Response, request, g
+
+import gzip
+import threading
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is used without it
+    brotli = None
+
+
+class Compression:
+    """Compresses api responses of at least `min_size` bytes with `level`."""
+
+    def __init__(self, level: int = 6, min_size: int = 1024):
+        self.level = level
+        self.min_size = min_size
+        self.encodings = ("br", "gzip") if brotli is not None else ("gzip",)
+        self._lock = threading.Lock()
+        self._stats = {"responses": 0, "reused": 0, "bytes": 0, "compressed_bytes": 0}
+
+    @property
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        stats["ratio"] = (
+            round(stats["bytes"] / stats["compressed_bytes"], 2)
+            if stats["compressed_bytes"]
+            else None
+        )
+        return stats
+
+    def negotiate(self) -> str | None:
+        """Best encoding that client of current request accepts."""
+        accepted = request.accept_encodings
+        qualities = [(accepted.quality(e), -i) for i, e in enumerate(self.encodings)]
+        quality, index = max(qualities)
+        return self.encodings[-index] if quality > 0 else None
+
+    def compress(self, data: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(data, quality=min(self.level, 11))  # type: ignore
+        return gzip.compress(data, self.level, mtime=0)
+
+    def stream(self, chunks, encoding: str):
+        """Compress an iterable of bytes chunk by chunk."""
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=min(self.level, 11))  # type: ignore
+            compress, flush = compressor.process, compressor.finish
+        else:
+            compressor = zlib.compressobj(
+                self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+            )
+            compress, flush = compressor.compress, compressor.flush
+        size = compressed_size = 0
+        for chunk in chunks:
+            size += len(chunk)
+            if data := compress(chunk):
+                compressed_size += len(data)
+                yield data
+        data = flush()
+        self._count(size, compressed_size + len(data))
+        yield data
+
+    def _count(self, size: int, compressed_size: int, reused: bool = False):
+        with self._lock:
+            self._stats["responses"] += 1
+            self._stats["reused"] += reused
+            self._stats["bytes"] += size
+            self._stats["compressed_bytes"] += compressed_size
+
+    def after_request(self, response: Response) -> Response:
+        cached = g.pop("cached_response", None)
+        if (
+            not request.path.startswith("/api/")
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+            or response.status_code in (204, 304)
+        ):
+            return response
+        if not response.is_streamed:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+        response.vary.add("Accept-Encoding")
+        if (encoding := self.negotiate()) is None:
+            return response
+        response.headers["Content-Encoding"] = encoding
+        if response.is_streamed:
+            response.response = self.stream(response.iter_encoded(), encoding)
+            response.headers.pop("Content-Length", None)
+            return response
+        # compressed bodies are kept with a cached body, while it is valid
+        key = (encoding, self.level)
+        if cached is not None and cached["body"] == data:
+            if not (reused := key in cached):
+                cached[key] = self.compress(data, encoding)
+            compressed = cached[key]
+        else:
+            compressed, reused = self.compress(data, encoding), False
+        self._count(len(data), len(compressed), reused)
+        response.set_data(compressed)
+        return response
+
+
+def install(app: Flask, compression: Compression):
+    """Compress api responses of `app`."""
+    app.extensions["compression"] = compression
+    app.after_request(compression.after_request)
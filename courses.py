@@ -0,0 +1,41 @@
+# this file contains courses (class sections) of the deployment. each course
+# has its own database file, so history of a course never piles up in others
+# and it can be archived independently.
+
+from peewee import Database, SqliteDatabase
+
+import sqlite3
+
+DEFAULT_COURSE = "default"
+MEMORY_URLS = (":memory:", "sqlite:///:memory:")
+
+# connections that keep in-memory databases alive
+_keepalive: list[sqlite3.Connection] = []
+
+
+def load_courses(config: dict) -> dict[str, Database]:
+    """
+    Connect to databases of courses in `config`.
+
+    `config["courses"]` maps course name to its database url, if it is missing
+    there is a single course that uses `config["database"]`.
+    """
+    urls = config.get("courses") or {DEFAULT_COURSE: config["database"]}
+    return {name: connect_course(name, url) for name, url in urls.items()}
+
+
+def connect_course(name: str, url: str) -> Database:
+    if url in MEMORY_URLS:
+        # every connection to ":memory:" opens a new empty database, so all
+        # connections (threads) share a named one that lives until exit.
+        uri = f"file:kian-{name}?mode=memory&cache=shared"
+        _keepalive.append(sqlite3.connect(uri, uri=True, check_same_thread=False))
+        return SqliteDatabase(uri, uri=True)
+
+    from playhouse.db_url import connect
+
+    return connect(url)
+
+
+def is_in_memory(database: Database) -> bool:
+    return isinstance(database, SqliteDatabase) and "mode=memory" in database.database
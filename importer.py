@@ -0,0 +1,139 @@
+# this file contains importing students from excel worksheets or csv files,
+# used by studmgr.py and the import job of admin api. files are read just up
+# to the needed rows, and students are inserted in a single transaction.
+
+from __future__ import annotations
+from collections import namedtuple
+from contextlib import contextmanager
+from typing import Callable
+from peewee import chunked
+from model import database_proxy, Student
+
+import csv
+import os
+import re
+
+validate_range_input = re.compile(r"([A-Z]+)(\d+):((\1\d+)|([A-Z]+)\2)")
+
+# messages of error codes of `validate_array`
+RANGE_ERRORS = (
+    "range is invalid",
+    "range must be a single row or column",
+    "range is empty",
+    "count of names and numbers mismatch",
+)
+
+
+def validate_array(inp, ws, len_match=0):
+    if validate_range_input.fullmatch(inp) is None:
+        return 1
+    start, end = inp.split(":")
+    array = ws[start:end]
+    if len(array) == 1 and len(array[0]) > 1:
+        array = [cell.value for cell in array[0]]
+    elif len(array) > 1 and len(array[0]) == 1:
+        array = [cell[0].value for cell in array]
+    else:
+        return 2
+
+    array = list(filter(None, array))
+    if not array:
+        return 3
+    if len_match > 0 and len(array) != len_match:
+        return 4
+    return 0, array
+
+
+Cell = namedtuple("Cell", "value")
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return index - 1
+
+
+class CsvSheet:
+    """A worksheet-like view of a csv file, `sheet["A1":"A12"]` is like openpyxl."""
+
+    _cell = re.compile(r"([A-Z]+)(\d+)")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.title = os.path.basename(path)
+
+    def __getitem__(self, key: slice):
+        (first_column, first_row), (last_column, last_row) = (
+            self._parse(key.start),
+            self._parse(key.stop),
+        )
+        rows = []
+        with open(self.path, newline="", encoding="utf-8-sig") as file:
+            for index, row in enumerate(csv.reader(file), 1):
+                if index > last_row:
+                    break
+                if index >= first_row:
+                    rows.append(
+                        tuple(
+                            Cell((row[i].strip() or None) if i < len(row) else None)
+                            for i in range(first_column, last_column + 1)
+                        )
+                    )
+        return tuple(rows)
+
+    def _parse(self, cell: str) -> tuple[int, int]:
+        letters, row = self._cell.fullmatch(cell).groups()  # type: ignore
+        return _column_index(letters), int(row)
+
+
+@contextmanager
+def open_sheet(path: str, sheet: str | None = None):
+    """Open worksheet of an xlsx file (`sheet` or the active one) or a csv file."""
+    if path.lower().endswith(".csv"):
+        yield CsvSheet(path)
+        return
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True)
+    try:
+        yield wb[sheet] if sheet is not None else wb.active
+    finally:
+        wb.close()
+
+
+def read_students(ws, names: str, numbers: str) -> list[dict]:
+    """
+    Students of ranges of worksheet `ws`.
+
+    :raises ValueError: If a range is not valid, see `RANGE_ERRORS`.
+    """
+    result = validate_array(names, ws)
+    if not isinstance(result, tuple):
+        raise ValueError(f"names: {RANGE_ERRORS[result - 1]}")
+    students_name = result[1]
+    result = validate_array(numbers, ws, len(students_name))
+    if not isinstance(result, tuple):
+        raise ValueError(f"numbers: {RANGE_ERRORS[result - 1]}")
+    return [
+        {"name": str(name).strip(), "number": str(number).strip()}
+        for name, number in zip(students_name, result[1])
+    ]
+
+
+def insert_students(
+    students: list[dict], progress: Callable[[int, int], None] | None = None
+) -> int:
+    """
+    Insert `students` in one transaction, students with an existing name or
+    number are skipped.
+
+    :returns: Count of inserted students.
+    """
+    before = Student.select().count()
+    with database_proxy.atomic():
+        for done, batch in enumerate(chunked(students, 100)):
+            if progress is not None:
+                progress(done * 100, len(students))
+            Student.insert_many(batch).on_conflict_ignore().execute()
+    return Student.select().count() - before
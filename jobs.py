@@ -0,0 +1,269 @@
+# this file contains the background job runner. heavy admin operations
+# (archiving, exports, ...) run on a small bounded pool of threads, so the
+# server keeps serving check-ins meanwhile. jobs are saved in database of
+# their course with their status and progress, so admin can poll them.
+
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date
+from typing import Callable
+from flask import Flask, current_app
+from model import database_proxy, Job
+
+import os
+import threading
+import time
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# job functions by kind, they are called like `func(context, **params)`
+KINDS: dict[str, Callable] = {}
+
+# kinds that just the server submits (not POST /api/v1/jobs), their params
+# are trusted
+INTERNAL: set[str] = set()
+
+
+def job(kind: str, internal: bool = False):
+    """Register decorated function as a job of `kind`."""
+
+    def decorator(func):
+        KINDS[kind] = func
+        if internal:
+            INTERNAL.add(kind)
+        return func
+
+    return decorator
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Context:
+    """Given to job functions to report progress of job."""
+
+    # minimum seconds between saving progress in database
+    interval = 0.5
+
+    def __init__(self, runner: "JobRunner", job_id: int, course: str | None):
+        self.runner = runner
+        self.job_id = job_id
+        self.course = course
+        self._saved_at = 0.0
+
+    @property
+    def cancelled(self) -> bool:
+        return self.job_id in self.runner._cancelled
+
+    def progress(self, done: float, total: float = 1, message: str | None = None):
+        """Report progress, raises `JobCancelled` if job is cancelled."""
+        if self.cancelled:
+            raise JobCancelled()
+        now = time.monotonic()
+        if now - self._saved_at >= self.interval or message is not None:
+            self._saved_at = now
+            fields = {Job.progress: done / total if total else 1}
+            if message is not None:
+                fields[Job.message] = message
+            Job.update(fields).where(Job.id == self.job_id).execute()  # type: ignore
+
+
+class JobRunner:
+    """Runs jobs on a bounded pool of threads, see `KINDS` for kinds of jobs."""
+
+    def __init__(self, app: Flask, workers: int = 2):
+        self.app = app
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="kian-job")
+        self._cancelled: set[int] = set()
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, params: dict | None = None, course=None) -> Job:
+        """Queue a job in database that models are routed to."""
+        if kind not in KINDS:
+            raise KeyError(kind)
+        job = Job.create(kind=kind, params=params or {})
+        self._executor.submit(self._run, job.id, database_proxy.current, course)
+        return job
+
+    def cancel(self, job_id: int) -> bool:
+        """Cancel a queued or running job, `False` if it is already finished."""
+        if (
+            Job.update(status=CANCELLED, finished_at=datetime.now())
+            .where((Job.id == job_id) & (Job.status == QUEUED))  # type: ignore
+            .execute()
+        ):
+            return True
+        if Job.select().where((Job.id == job_id) & (Job.status == RUNNING)).exists():  # type: ignore
+            with self._lock:
+                self._cancelled.add(job_id)
+            return True
+        return False
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait)
+
+    def _run(self, job_id: int, database, course):
+        with self.app.app_context(), database_proxy.routed(database):
+            try:
+                with database.connection_context():
+                    self._run_job(job_id, course)
+            except Exception:  # executor would hide it
+                self.app.logger.exception("Can not run job %d.", job_id)
+
+    def _run_job(self, job_id: int, course):
+        started = (
+            Job.update(status=RUNNING, started_at=datetime.now())
+            .where((Job.id == job_id) & (Job.status == QUEUED))  # type: ignore
+            .execute()
+        )
+        if not started:  # cancelled while it was queued
+            return
+        job = Job.get_by_id(job_id)
+        fields = {}
+        try:
+            result = KINDS[job.kind](Context(self, job_id, course), **job.params)
+        except JobCancelled:
+            fields[Job.status] = CANCELLED
+        except Exception as e:
+            self.app.logger.exception('Job %d ("%s") failed.', job_id, job.kind)
+            fields[Job.status] = FAILED
+            fields[Job.message] = f"{type(e).__name__}: {e}"
+        else:
+            fields[Job.status] = DONE
+            fields[Job.progress] = 1
+            fields[Job.result] = result
+        finally:
+            with self._lock:
+                self._cancelled.discard(job_id)
+        fields[Job.finished_at] = datetime.now()
+        Job.update(fields).where(Job.id == job_id).execute()  # type: ignore
+
+
+def recover():
+    """Mark jobs that were not finished when server stopped as failed."""
+    Job.update(
+        status=FAILED, message="server stopped", finished_at=datetime.now()
+    ).where(
+        Job.status.in_([QUEUED, RUNNING])  # type: ignore
+    ).execute()
+
+
+# ---- kinds of jobs ----
+
+
+@job("archive")
+def archive_job(context: Context, before: str):
+    """Archive closed meetings before `before`, see archive.py."""
+    from archive import archive
+    from cache import summaries, ranks
+
+    directory = current_app.config["archive directory"]
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{context.course}-{before}.sqlite")
+    result = archive(date.fromisoformat(before), path, context.progress)
+    # summaries of students include archived meetings
+    summaries.clear()
+    ranks.invalidate()
+    return result
+
+
+@job("anomalies")
+def anomalies_job(context: Context):
+    """Analyze all closed meetings again, see anomalies.py."""
+    import anomalies
+    from model import Meeting
+
+    meetings = list(Meeting.select().where(Meeting.in_progress == False))  # noqa: E712
+    found = 0
+    for done, meeting in enumerate(meetings):
+        context.progress(done, len(meetings))
+        found += anomalies.analyze(meeting)
+    return {"meetings": len(meetings), "anomalies": found}
+
+
+@job("export")
+def export_job(context: Context):
+    """Export attendances and total scores of students to an excel file."""
+    from openpyxl import Workbook
+    from peewee import fn
+    from model import Student, Attendance, Score, Meeting
+
+    meetings = Meeting.select().count()
+    attendances = dict(
+        Attendance.select(Attendance.student, fn.COUNT(Attendance.id))
+        .group_by(Attendance.student)
+        .tuples()
+    )
+    scores = {
+        student_id: (total_score, total_full_score)
+        for student_id, total_score, total_full_score in Score.select(
+            Score.student, fn.SUM(Score.score), fn.SUM(Score.full_score)
+        )
+        .group_by(Score.student)
+        .tuples()
+    }
+    students = list(Student.select(Student.id, Student.name, Student.number).tuples())
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "students"  # type: ignore
+    ws.append(  # type: ignore
+        ["number", "name", "attendances", "absences", "total score", "total full score"]
+    )
+    for done, (student_id, name, number) in enumerate(students):
+        context.progress(done, len(students))
+        count = attendances.get(student_id, 0)
+        ws.append(  # type: ignore
+            [number, name, count, meetings - count, *scores.get(student_id, (0, 0))]
+        )
+
+    directory = current_app.config["export directory"]
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(
+        directory, f"{context.course}-{datetime.now():%Y%m%d-%H%M%S}.xlsx"
+    )
+    wb.save(path)
+    return {"file": path, "students": len(students)}
+
+
+@job("backup")
+def backup_job(context: Context):
+    """Take an online snapshot of database and verify it, see backup.py."""
+    from backup import backup, verify
+
+    path = backup(
+        current_app.config["backup directory"],
+        context.course or "backup",
+        keep=current_app.config["backups to keep"],
+        progress=context.progress,
+    )
+    return {"file": path, "tables": verify(path)}
+
+
+@job("import", internal=True)
+def import_job(
+    context: Context, path: str, names: str, numbers: str, sheet: str | None = None
+):
+    """
+    Import students from a file that POST /api/v1/students/import uploaded
+    and remove it, see importer.py.
+    """
+    from importer import open_sheet, read_students, insert_students
+    from cache import roster, summaries, ranks
+
+    try:
+        with open_sheet(path, sheet) as ws:
+            students = read_students(ws, names, numbers)
+        inserted = insert_students(students, context.progress)
+    finally:
+        os.remove(path)
+    # caches are loaded again after commit, so they never have a half import
+    roster.warm()
+    summaries.clear()
+    ranks.invalidate()
+    return {"students": len(students), "inserted": inserted}
@@ -0,0 +1,75 @@
+# this file contains ranking of students by their scores. totals (with
+# archived ones) and ranks are computed in one query with window functions,
+# the result is cached until the next write of scores (see `Leaderboard` in
+# cache.py), so students can check their rank without aggregating scores of
+# the whole class on each request.
+
+from peewee import JOIN, Select, fn
+from model import Score, Student, StudentSummary
+
+
+def ranking() -> list[dict]:
+    """
+    Total and normalized (total / total full score) score of each student with
+    their ranks and percentiles, ordered by rank of total.
+    """
+    total = fn.COALESCE(fn.SUM(Score.score), 0) + fn.COALESCE(
+        StudentSummary.total_score, 0
+    )
+    full = fn.COALESCE(fn.SUM(Score.full_score), 0) + fn.COALESCE(
+        StudentSummary.total_full_score, 0
+    )
+    totals = (
+        Student.select(
+            Student.id,
+            Student.name,
+            Student.number,
+            total.alias("total_score"),
+            full.alias("total_full_score"),
+            (total * 1.0 / fn.NULLIF(full, 0)).alias("normalized"),
+        )
+        .join(Score, JOIN.LEFT_OUTER)
+        .switch(Student)
+        .join(
+            StudentSummary,
+            JOIN.LEFT_OUTER,
+            on=(StudentSummary.student == Student.id),
+        )
+        .group_by(Student.id)
+        .cte("totals")
+    )
+    by_total = [totals.c.total_score.desc()]
+    # students without full score have no normalized score, they are the last
+    by_normalized = [totals.c.normalized.desc(nulls="LAST")]
+    query = (
+        Select(
+            [totals],
+            [
+                totals.c.id,
+                totals.c.name,
+                totals.c.number,
+                totals.c.total_score,
+                totals.c.total_full_score,
+                totals.c.normalized,
+                fn.RANK().over(order_by=by_total).alias("rank"),
+                # percent of students with a lower or equal score
+                fn.CUME_DIST()
+                .over(order_by=[totals.c.total_score])
+                .alias("percentile"),
+                fn.RANK().over(order_by=by_normalized).alias("normalized_rank"),
+                fn.CUME_DIST()
+                .over(order_by=[totals.c.normalized.asc(nulls="FIRST")])
+                .alias("normalized_percentile"),
+            ],
+        )
+        .with_cte(totals)
+        .order_by(totals.c.total_score.desc(), totals.c.id)
+        .bind(Student._meta.database)  # type: ignore
+    )
+    rows = list(query.dicts())
+    for row in rows:
+        if row["normalized"] is not None:
+            row["normalized"] = round(row["normalized"], 4)
+        row["percentile"] = round(row["percentile"] * 100, 1)
+        row["normalized_percentile"] = round(row["normalized_percentile"] * 100, 1)
+    return rows
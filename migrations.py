@@ -0,0 +1,103 @@
+# this file contains migrations of databases that are created by older
+# versions of Kian. they run when app starts (and by `flask --app app
+# init-db`), each migration checks that it is needed, so running them again
+# is safe.
+
+from peewee import Case, Database, chunked
+from playhouse.migrate import SchemaMigrator, migrate as apply
+from model import database_proxy, epoch, Meeting, Attendance, Change
+
+import changes
+
+
+def _has_column(database: Database, model, name: str) -> bool:
+    table = model._meta.table_name
+    return any(column.name == name for column in database.get_columns(table))
+
+
+def _update(model, field, values: dict[int, int]):
+    """Set `field` of rows by id in batches, one query per batch."""
+    for batch in chunked(values.items(), 500):
+        model.update({field: Case(model.id, batch)}).where(
+            model.id.in_([row_id for row_id, _ in batch])
+        ).execute()
+
+
+def timestamps(database: Database) -> bool:
+    """Add timestamp columns of meetings and attendances and fill them."""
+    migrator = SchemaMigrator.from_database(database)
+    operations = []
+    for model, field in (
+        (Meeting, Meeting.start_timestamp),
+        (Meeting, Meeting.end_timestamp),
+        (Attendance, Attendance.timestamp),
+    ):
+        if not _has_column(database, model, field.column_name):
+            table = model._meta.table_name  # type: ignore
+            # it adds index of field too
+            operations.append(migrator.add_column(table, field.column_name, field))
+    with database_proxy.routed(database), database_proxy.atomic():
+        if operations:
+            apply(*operations)
+        meetings = list(
+            Meeting.select(Meeting.id, Meeting.date, Meeting.start_at, Meeting.end_at)
+            .where(
+                Meeting.start_timestamp.is_null()
+                | (Meeting.end_at.is_null(False) & Meeting.end_timestamp.is_null())
+            )
+            .tuples()
+        )
+        _update(
+            Meeting,
+            Meeting.start_timestamp,
+            {row_id: epoch(day, start) for row_id, day, start, _ in meetings},
+        )
+        _update(
+            Meeting,
+            Meeting.end_timestamp,
+            {
+                row_id: epoch(day, end, start)
+                for row_id, day, start, end in meetings
+                if end is not None
+            },
+        )
+        attendances = {
+            row_id: epoch(day, at, start)
+            for row_id, at, day, start in Attendance.select(
+                Attendance.id, Attendance.time, Meeting.date, Meeting.start_at
+            )
+            .join(Meeting)
+            .where(Attendance.timestamp.is_null())
+            .tuples()
+            .iterator()
+        }
+        _update(Attendance, Attendance.timestamp, attendances)
+    return bool(operations or meetings or attendances)
+
+
+def change_log(database: Database) -> bool:
+    """Create change log and triggers that write it (see changes.py)."""
+    triggers = changes.triggers(database)
+    with database_proxy.routed(database), database_proxy.atomic():
+        created = not Change.table_exists()
+        Change.create_table()
+        if triggers:
+            existing = {
+                name
+                for name, in database.execute_sql(
+                    "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+                )
+            }
+            for name, sql in triggers.items():
+                if name not in existing:
+                    database.execute_sql(sql)
+                    created = True
+    return created
+
+
+MIGRATIONS = (timestamps, change_log)
+
+
+def migrate(database: Database) -> list[str]:
+    """Run migrations on `database`, returns names of ones that changed it."""
+    return [migration.__name__ for migration in MIGRATIONS if migration(database)]
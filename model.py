@@ -1,6 +1,9 @@
+from __future__ import annotations
 from peewee import (
+    Database,
     DatabaseProxy,
     Model,
+    SelectBase,
     TextField,
     FixedCharField,
     BooleanField,
@@ -9,11 +12,106 @@ from peewee import (
     FloatField,
     DateField,
     TimeField,
+    IntegerField,
 )
-from datetime import datetime
+from datetime import datetime, date, time, timedelta
 from playhouse.shortcuts import model_to_dict
+from contextvars import ContextVar
+from contextlib import contextmanager
 
-database_proxy = DatabaseProxy()
+import itertools
+import json
+
+_writes = itertools.count(1)
+
+
+class DatabaseRouter(DatabaseProxy):
+    """
+    A database proxy that can be routed to another database in current context
+    (e.g. per request), `initialize` sets the default database.
+
+    It also counts writes of each database (see `generation`), so results that
+    are computed from a database can be cached until its next write.
+    """
+
+    __slots__ = ("obj", "_callbacks", "_routed", "_generations")
+
+    def __init__(self):
+        self._routed = ContextVar("routed_database", default=None)
+        self._generations: dict[Database, int] = {}
+        super().__init__()
+
+    @property
+    def current(self) -> Database | None:
+        return self._routed.get() or self.obj
+
+    def route(self, database: Database | None):
+        """Route models to `database` in current context, `None` means default."""
+        return self._routed.set(database)
+
+    def reset(self, token):
+        self._routed.reset(token)
+
+    @contextmanager
+    def routed(self, database: Database | None):
+        token = self.route(database)
+        try:
+            yield database
+        finally:
+            self.reset(token)
+
+    def generation(self, database: Database | None = None) -> int:
+        """
+        Changes after each write query to `database` (default: current one)
+        and after each transaction of `atomic`. Writes of other processes are
+        not counted.
+        """
+        return self._generations.get(database or self.current, 0)  # type: ignore
+
+    def bump(self, database: Database | None = None):
+        self._generations[database or self.current] = next(_writes)  # type: ignore
+
+    def execute(self, query, *args, **kwargs):
+        database = self.current
+        try:
+            return database.execute(query, *args, **kwargs)  # type: ignore
+        finally:
+            if not isinstance(query, SelectBase):
+                self.bump(database)
+
+    @contextmanager
+    def atomic(self, *args, **kwargs):
+        database = self.current
+        try:
+            with database.atomic(*args, **kwargs) as transaction:  # type: ignore
+                yield transaction
+        finally:
+            # a reader between a write and commit may have cached old rows
+            self.bump(database)
+
+    def __enter__(self):
+        return self.current.__enter__()  # type: ignore
+
+    def __exit__(self, *args):
+        return self.current.__exit__(*args)  # type: ignore
+
+    def __getattr__(self, attr):
+        if (database := self.current) is None:
+            raise AttributeError("Cannot use uninitialized Proxy.")
+        return getattr(database, attr)
+
+
+database_proxy = DatabaseRouter()
+
+
+class JSONField(TextField):
+    """A text field that keeps a json serializable value."""
+
+    def db_value(self, value):
+        return None if value is None else json.dumps(value, default=str)
+
+    def python_value(self, value):
+        return None if value is None else json.loads(value)
 
 
 class BaseModel(Model):
@@ -44,19 +142,62 @@ class BaseModel(Model):
         :param int max_depth: Maximum depth to recurse, value <= 0 means no max.
         """
         if exclude is Ellipsis:
-            exclude = [Meeting.scores]  # type: ignore
-        res = model_to_dict(
-            self,
-            recurse=recurse,
-            backrefs=backrefs,
-            only=only,
-            exclude=exclude,
-            extra_attrs=extra_attrs,
-            max_depth=max_depth,
-        )
+            # scores of meetings of related objects, but a meeting keeps its own
+            exclude = None if isinstance(self, Meeting) else [Meeting.scores]  # type: ignore
+        res = None
+        if (
+            max_depth == 1
+            and recurse
+            and backrefs
+            and only is None
+            and extra_attrs is None
+            and not self._excludes_own(exclude)
+            and self.id is not None  # type: ignore
+        ):
+            # common case of api, use generated serializer (see serializers.py)
+            from serializers import serializer_for
+
+            res = serializer_for(type(self)).one(self)
+        if res is None:
+            res = model_to_dict(
+                self,
+                recurse=recurse,
+                backrefs=backrefs,
+                only=only,
+                exclude=exclude,
+                extra_attrs=extra_attrs,
+                max_depth=max_depth,
+            )
+            res.update(self.computed())
         res.update(**update)
         return res
 
+    def computed(self) -> dict[str, object]:
+        """Fields that are not columns but are included in dict of model."""
+        return {}
+
+    def _excludes_own(self, exclude) -> bool:
+        """Whether `exclude` has a field or backref of this model."""
+        if not exclude:
+            return False
+        own = set(self._meta.sorted_fields)  # type: ignore
+        for foreign_key in self._meta.backrefs:  # type: ignore
+            own.add(foreign_key)
+            if foreign_key.backref != "+":
+                own.add(getattr(type(self), foreign_key.backref))
+        return any(item in own for item in exclude)
+
+
+def epoch(day: date, at: time, after: time | None = None) -> int:
+    """
+    Unix timestamp (seconds) of `at` of `day` in local time, or of next day if
+    `at` is before `after` (e.g. a meeting that passes midnight).
+    """
+    moment = datetime.combine(day, at)
+    if after is not None and at < after:
+        moment += timedelta(days=1)
+    return int(moment.timestamp())
+
 
 class Meeting(
     BaseModel
@@ -65,27 +206,24 @@ class Meeting(
     start_at = TimeField(default=lambda: datetime.now().time())
     end_at = TimeField(null=True)
     in_progress = BooleanField(default=True)
+    # timestamps of date and times above, for range queries (see `save`)
+    start_timestamp = IntegerField(null=True, index=True)
+    end_timestamp = IntegerField(null=True)
     # attendances
     # scores
 
+    def save(self, *args, **kwargs):
+        self.start_timestamp = epoch(self.date, self.start_at)  # type: ignore
+        if self.end_at is not None:
+            self.end_timestamp = epoch(self.date, self.end_at, self.start_at)  # type: ignore
+        return super().save(*args, **kwargs)
+
     @property
     def count_of_attendances(self):
         return self.attendances.count()  # type:ignore
 
-    def to_dict(
-        self,
-        recurse=True,
-        backrefs=True,
-        only=None,
-        exclude=None,
-        extra_attrs=None,
-        max_depth=None,
-        update={},
-    ) -> dict[str, object]:
-        update["count_of_attendances"] = self.count_of_attendances
-        return super().to_dict(
-            recurse, backrefs, only, exclude, extra_attrs, max_depth, update
-        )
+    def computed(self) -> dict[str, object]:
+        return {"count_of_attendances": self.count_of_attendances}
 
 
 class Student(BaseModel):
@@ -103,21 +241,11 @@ class Student(BaseModel):
     def total_full_score(self):
         return sum(map(lambda score: score.full_score, self.scores))  # type: ignore
 
-    def to_dict(
-        self,
-        recurse=True,
-        backrefs=True,
-        only=None,
-        exclude=None,
-        extra_attrs=None,
-        max_depth=None,
-        update={},
-    ) -> dict[str, object]:
-        update["total_score"] = self.total_score
-        update["total_full_score"] = self.total_full_score
-        return super().to_dict(
-            recurse, backrefs, only, exclude, extra_attrs, max_depth, update
-        )
+    def computed(self) -> dict[str, object]:
+        return {
+            "total_score": self.total_score,
+            "total_full_score": self.total_full_score,
+        }
 
 
 class Device(BaseModel):  # type: ignore
@@ -133,6 +261,12 @@ class Attendance(BaseModel):  # type: ignore
     device = ForeignKeyField(Device, backref="login_history")
     meeting = ForeignKeyField(Meeting, backref="attendances")
     time = TimeField(default=lambda: datetime.now().time())
+    timestamp = IntegerField(null=True, index=True)  # of `time` (see `save`)
+
+    def save(self, *args, **kwargs):
+        meeting = self.meeting  # type: ignore
+        self.timestamp = epoch(meeting.date, self.time, meeting.start_at)  # type: ignore
+        return super().save(*args, **kwargs)
 
 
 class Score(BaseModel):
@@ -143,4 +277,53 @@ class Score(BaseModel):
     reason = TextField(null=True)
 
 
-_TABLES_ = (Meeting, Device, Student, Attendance, Score)
+class StudentSummary(BaseModel):
+    # compact summary of archived meetings, see archive.py
+    student = ForeignKeyField(Student, unique=True, backref="+")
+    meetings = IntegerField(default=0)
+    attendances = IntegerField(default=0)
+    total_score = FloatField(default=0)
+    total_full_score = FloatField(default=0)
+
+
+class Anomaly(BaseModel):
+    # suspicious check-ins of a closed meeting, see anomalies.py
+    kind = TextField()
+    meeting = ForeignKeyField(Meeting, backref="+")
+    device = ForeignKeyField(Device, backref="+")
+    student = ForeignKeyField(Student, null=True, backref="+")
+    count = IntegerField(default=1)
+
+
+class Job(BaseModel):
+    # background jobs of admin, see jobs.py
+    kind = TextField()
+    params = JSONField(default=dict)
+    status = TextField(default="queued")
+    progress = FloatField(default=0)  # 0 to 1
+    message = TextField(null=True)
+    result = JSONField(null=True)
+    created_at = DateTimeField(default=datetime.now)
+    started_at = DateTimeField(null=True)
+    finished_at = DateTimeField(null=True)
+
+
+class Change(BaseModel):
+    # append-only log of writes of tracked tables, it is written by triggers in
+    # the same transaction as the write (see changes.py)
+    table_name = TextField()
+    row_id = IntegerField()
+    operation = TextField()  # insert, update, delete or reset
+
+
+_TABLES_ = (
+    Meeting,
+    Device,
+    Student,
+    Attendance,
+    Score,
+    StudentSummary,
+    Anomaly,
+    Job,
+    Change,
+)
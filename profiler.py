@@ -0,0 +1,175 @@
+# this file contains an on-demand profiler of requests. admin arms it for
+# the next requests of an endpoint (or sends the profile header), those
+# requests run under cProfile and their sql queries are captured. results are
+# kept in a small ring buffer. when nothing is armed it costs a check per
+# request.
+
+from __future__ import annotations
+from collections import deque
+from datetime import datetime
+from flask import Flask, request, session, g
+
+import cProfile
+import contextvars
+import hashlib
+import hmac
+import io
+import itertools
+import logging
+import marshal
+import pstats
+import threading
+import time
+
+HEADER = "X-Kian-Profile"
+
+# queries of the profile of current request
+_queries: contextvars.ContextVar[list | None] = contextvars.ContextVar(
+    "profiled_queries", default=None
+)
+
+
+def signature(key: str, path: str, expires_at: int) -> str:
+    """
+    Value of profile header that profiles requests to `path` until
+    `expires_at` (unix timestamp).
+    """
+    message = f"{path}|{expires_at}".encode()
+    digest = hmac.new(key.encode(), message, hashlib.sha256).hexdigest()
+    return f"{expires_at}.{digest}"
+
+
+def verify(key: str, value: str, path: str) -> bool:
+    """Whether `value` is a signature of `path` by `key` that is not expired."""
+    expires_at, _, _ = value.partition(".")
+    if not expires_at.isdecimal() or int(expires_at) < time.time():
+        return False
+    return hmac.compare_digest(value, signature(key, path, int(expires_at)))
+
+
+class _QueryHandler(logging.Handler):
+    """Keeps sql queries that peewee logs in profile of current request."""
+
+    def emit(self, record):
+        if (queries := _queries.get()) is not None:
+            sql, params = (
+                record.msg if isinstance(record.msg, tuple) else (record.msg, ())
+            )
+            queries.append(
+                {"at": record.created, "sql": sql, "params": [str(p) for p in params]}
+            )
+
+
+class Profiler:
+    """Profiles requests that are armed by admin, see `arm` and `HEADER`."""
+
+    def __init__(self, key: str | None, size: int = 20, lines: int = 40):
+        self.key = key
+        self.lines = lines
+        self.profiles: deque[dict] = deque(maxlen=size)
+        self._armed: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._active = 0
+        self._logger = logging.getLogger("peewee")
+        self._level = self._logger.level
+        if not any(isinstance(h, _QueryHandler) for h in self._logger.handlers):
+            self._logger.addHandler(_QueryHandler())
+
+    def arm(self, endpoint: str, count: int = 1):
+        """Profile next `count` requests of `endpoint` ("*" for any endpoint)."""
+        with self._lock:
+            if count > 0:
+                self._armed[endpoint] = count
+            else:
+                self._armed.pop(endpoint, None)
+
+    @property
+    def armed(self) -> dict[str, int]:
+        return dict(self._armed)
+
+    def get(self, profile_id: int) -> dict | None:
+        return next((p for p in self.profiles if p["id"] == profile_id), None)
+
+    def _should_profile(self) -> bool:
+        if (value := request.headers.get(HEADER)) is not None:
+            if session.get("admin", False):
+                return True
+            # signed headers are not accepted without a secret key
+            return self.key is not None and verify(self.key, value, request.path)
+        if not self._armed:
+            return False
+        with self._lock:
+            for endpoint in (request.endpoint, "*"):
+                if (left := self._armed.get(endpoint)) is not None:  # type: ignore
+                    if left <= 1:
+                        del self._armed[endpoint]  # type: ignore
+                    else:
+                        self._armed[endpoint] = left - 1  # type: ignore
+                    return True
+        return False
+
+    def _start(self):
+        if not self._should_profile():
+            return
+        with self._lock:
+            self._active += 1
+            self._logger.setLevel(logging.DEBUG)
+        queries = []
+        profile = cProfile.Profile()
+        g._profile = (profile, _queries.set(queries), queries, time.time())
+        profile.enable()
+
+    def _stop(self, status: int):
+        if (started := g.pop("_profile", None)) is None:
+            return
+        profile, token, queries, start = started
+        profile.disable()
+        duration = time.time() - start
+        _queries.reset(token)
+        with self._lock:
+            self._active -= 1
+            if not self._active:
+                self._logger.setLevel(self._level)
+        stats = pstats.Stats(profile, stream=(text := io.StringIO()))
+        stats.sort_stats("cumulative").print_stats(self.lines)
+        stats.print_callees(self.lines)
+        self.profiles.append(
+            {
+                "id": next(self._ids),
+                "method": request.method,
+                "path": request.full_path.rstrip("?"),
+                "endpoint": request.endpoint,
+                "status": status,
+                "started_at": datetime.fromtimestamp(start).isoformat(
+                    timespec="seconds"
+                ),
+                "duration": round(duration * 1000, 3),
+                # `at` is milliseconds after start of request
+                "queries": [
+                    dict(query, at=round((query["at"] - start) * 1000, 3))
+                    for query in queries
+                ],
+                "stats": text.getvalue(),
+                "dump": marshal.dumps(stats.stats),  # type: ignore
+            }
+        )
+
+
+def install(app: Flask, profiler: Profiler):
+    """Profile requests of `app` that are armed in `profiler`."""
+    app.extensions["profiler"] = profiler
+
+    @app.before_request
+    def _start_profile():
+        profiler._start()
+
+    @app.after_request
+    def _stop_profile(response):
+        profiler._stop(response.status_code)
+        return response
+
+    @app.teardown_request
+    def _stop_failed_profile(exc):
+        if exc is not None:  # after_request is not called on exceptions
+            profiler._stop(500)
@@ -0,0 +1,184 @@
+# this file contains the weekly timetable of meetings ("schedule" in
+# config.json). a background thread opens scheduled meetings at their start
+# and closes them at their end. a few minutes before start it warms up what
+# check-ins need (roster, present set and pages of database), so the first
+# check-ins of a meeting are as fast as the next ones.
+
+from __future__ import annotations
+from datetime import date, datetime, time, timedelta
+from flask import Flask
+from peewee import Database, SqliteDatabase
+from model import database_proxy, Meeting
+from cache import present, roster, summaries
+from courses import is_in_memory
+
+import anomalies
+import os
+import threading
+
+# index of a day is its `date.weekday()`
+DAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+
+class Slot:
+    """A weekly meeting of a course, from `start` to `end` on `days`."""
+
+    def __init__(self, course: str, days: list[str], start: time, end: time):
+        self.course = course
+        self.days = {DAYS.index(day.lower()) for day in days}
+        self.start = start
+        self.end = end
+
+    def window(self, day: date) -> tuple[datetime, datetime] | None:
+        """Start and end of meeting of `day`, `None` if there is no meeting."""
+        if day.weekday() not in self.days:
+            return None
+        start = datetime.combine(day, self.start)
+        end = datetime.combine(day, self.end)
+        if end <= start:  # ends after midnight
+            end += timedelta(days=1)
+        return start, end
+
+    def next_start(self, now: datetime) -> datetime:
+        """Start of next meeting of slot after `now`."""
+        for offset in range(8):
+            window = self.window(now.date() + timedelta(days=offset))
+            if window is not None and window[0] > now:
+                return window[0]
+        raise ValueError("slot has no day")
+
+    def to_dict(self, now: datetime) -> dict:
+        return {
+            "course": self.course,
+            "days": [DAYS[day] for day in sorted(self.days)],
+            "start": self.start.isoformat(timespec="minutes"),
+            "end": self.end.isoformat(timespec="minutes"),
+            "next_start": self.next_start(now).isoformat(timespec="minutes"),
+        }
+
+
+def parse(schedule: list[dict], courses) -> list[Slot]:
+    """
+    Slots of "schedule" of config.json, a slot without "course" belongs to the
+    default (first) course.
+
+    :raises ValueError: If a day, time or course is invalid.
+    """
+    slots = []
+    for item in schedule:
+        course = item.get("course", next(iter(courses)))
+        if course not in courses:
+            raise ValueError(f'course "{course}" of schedule not found.')
+        if not item.get("days"):
+            raise ValueError("a slot of schedule has no days.")
+        if unknown := [day for day in item["days"] if day.lower() not in DAYS]:
+            raise ValueError(f"unknown days in schedule: {', '.join(unknown)}.")
+        start, end = time.fromisoformat(item["start"]), time.fromisoformat(item["end"])
+        slots.append(Slot(course, item["days"], start, end))
+    return slots
+
+
+def open_meeting(at: datetime | None = None) -> Meeting:
+    """Start a meeting at `at` (default: now) in database that models are routed to."""
+    at = at or datetime.now()
+    meeting = Meeting.create(date=at.date(), start_at=at.time())
+    present.load(meeting)
+    summaries.clear()
+    return meeting
+
+
+def close_meeting(meeting: Meeting, at: datetime | None = None) -> bool:
+    """End `meeting` at `at` (default: now), returns `False` if it is not saved."""
+    meeting.in_progress = False  # type: ignore
+    meeting.end_at = (at or datetime.now()).time()  # type: ignore
+    if not meeting.save():
+        return False
+    present.load(None)
+    anomalies.analyze(meeting)
+    return True
+
+
+def warm_up(database: Database):
+    """Load indexes that check-ins use and pages of `database` in memory."""
+    roster.warm()
+    present.ensure(Meeting.get_or_none(Meeting.in_progress == True))  # noqa: E712
+    list(Meeting.select().dicts())  # check-ins return all meetings
+    if isinstance(database, SqliteDatabase) and not is_in_memory(database):
+        # connections are opened per request, so just os cache of the file
+        # outlives them
+        for path in (database.database, database.database + "-wal"):
+            if os.path.exists(path):
+                with open(path, "rb") as file:
+                    while file.read(1 << 20):
+                        pass
+
+
+class Scheduler:
+    """Opens and closes meetings of `slots`, warms up `warm_up_before` seconds before."""
+
+    # seconds between checks of slots
+    interval = 30
+
+    def __init__(self, app: Flask, slots: list[Slot], warm_up_before: float = 300):
+        self.app = app
+        self.slots = slots
+        self.warm_up_before = timedelta(seconds=warm_up_before)
+        self._warmed: set[tuple[int, date]] = set()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="kian-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            try:
+                self.tick()
+            except Exception:  # keep the thread alive
+                self.app.logger.exception("Can not check schedule of meetings.")
+            if self._stop.wait(self.interval):
+                return
+
+    def tick(self, now: datetime | None = None):
+        """Warm up, open or close meetings of slots that are due at `now`."""
+        now = now or datetime.now()
+        yesterday = now.date() - timedelta(days=1)
+        self._warmed = {item for item in self._warmed if item[1] >= yesterday}
+        courses = self.app.extensions["courses"]
+        for index, slot in enumerate(self.slots):
+            database = courses[slot.course]
+            with self.app.app_context(), database_proxy.routed(database):
+                with database.connection_context():
+                    # meeting of yesterday is still open if it ends after midnight
+                    for day in (yesterday, now.date()):
+                        if (window := slot.window(day)) is not None:
+                            self._check(index, slot.course, day, window, now)
+
+    def _check(self, index: int, course: str, day: date, window, now: datetime):
+        start, end = window
+        since = start - self.warm_up_before
+        if since <= now < start and (index, day) not in self._warmed:
+            warm_up(database_proxy.current)  # type: ignore
+            self._warmed.add((index, day))
+            self.app.logger.info('Course "%s" warmed up for meeting.', course)
+        if now < start:
+            return
+        meeting = Meeting.get_or_none(Meeting.in_progress == True)  # noqa: E712
+        # a meeting that is started by admin around start belongs to slot too
+        first, last = int(since.timestamp()), int(end.timestamp()) - 1
+        if now < end:
+            in_window = Meeting.start_timestamp.between(first, last)
+            if meeting is None and not Meeting.select().where(in_window).exists():
+                open_meeting(now)
+                self.app.logger.info('Scheduled meeting of "%s" started.', course)
+        elif meeting is not None and first <= meeting.start_timestamp <= last:
+            close_meeting(meeting, end)
+            self.app.logger.info('Scheduled meeting of "%s" ended.', course)
@@ -28,3 +28,41 @@ SCORE_SCHEMA = {
     "additionalProperties": False,
     "required": ["student", "score"],
 }
+
+SCORES_SCHEMA = {"type": "array", "items": SCORE_SCHEMA}  # bulk grading
+
+BLOCK_SCHEMA = {
+    "type": "object",
+    "properties": {"blocked": {"type": "boolean"}},
+    "additionalProperties": False,
+    "required": ["blocked"],
+}
+
+JOB_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "kind": {"type": "string"},  # see KINDS of jobs.py
+        "params": {"type": "object"},
+    },
+    "additionalProperties": False,
+    "required": ["kind"],
+}
+
+PROFILE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "endpoint": {"type": "string"},  # like "kian.get_students" or "*"
+        "count": {"type": "integer", "minimum": 0, "maximum": 100},
+    },
+    "additionalProperties": False,
+    "required": ["endpoint"],
+}
+
+ARCHIVE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "before": {"type": "string", "pattern": r"^\d{4}-\d{2}-\d{2}$"},  # date
+    },
+    "additionalProperties": False,
+    "required": ["before"],
+}
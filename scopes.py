@@ -0,0 +1,55 @@
+# this file contains scopes of the current user: admin can read every row,
+# a registered student just the rows that they own. scopes are conditions
+# that are added to the query of an endpoint, so checking access costs no
+# extra query.
+
+from __future__ import annotations
+from flask import session, g
+from model import Attendance, Device, Student
+from serializers import serialize
+
+# field of the owner student of rows that students can read
+OWNERS = {Student: Student.id, Attendance: Attendance.student, Device: Device.student}
+
+
+def student_id() -> int | None:
+    """
+    Id of student of current session (or check-in token), `None` if device is
+    not registered.
+    """
+    if (claims := g.get("token")) is not None:
+        return claims.student_id
+    # just the id, rest of pickled student may be stale
+    return std.id if (std := session.get("student")) is not None else None
+
+
+def scope(model):
+    """
+    Condition of rows of `model` that current user can read, `None` means
+    all rows (admin).
+
+    :raises PermissionError: If user is neither admin nor a registered student,
+        or students can not read `model`.
+    """
+    if session.get("admin"):
+        return None
+    if (owner := student_id()) is None or model not in OWNERS:
+        raise PermissionError(model.__name__)
+    return OWNERS[model] == owner
+
+
+def scoped(model, where):
+    """`where` restricted to scope of current user, see `scope`."""
+    condition = scope(model)
+    return where if condition is None else where & condition
+
+
+def get(model, row_id: int) -> dict | None:
+    """
+    Serialized row of `model` with `row_id` (see serializers.py) if current
+    user can read it, `None` if it is not existed or not in scope of user.
+
+    :raises PermissionError: Same as `scope`.
+    """
+    rows = serialize(model, scoped(model, model.id == row_id))
+    return rows[0] if rows else None
@@ -0,0 +1,131 @@
+# this file contains serializers that are generated for each model,
+# they build the same dicts as `model_to_dict` but from raw row tuples: one
+# joined query for a model and its foreign keys and one query per backref,
+# instead of a query per related object.
+
+from __future__ import annotations
+from peewee import JOIN, ForeignKeyField
+from model import BaseModel, Student, Meeting
+
+# fields that models add to their dicts (see `computed` of models), here they
+# are computed from backrefs that are already in the dict.
+COMPUTED = {
+    Student: lambda data: {
+        "total_score": sum(score["score"] for score in data["scores"]),
+        "total_full_score": sum(score["full_score"] for score in data["scores"]),
+    },
+    Meeting: lambda data: {"count_of_attendances": len(data["attendances"])},
+}
+
+
+def _dict_source(keys: list[str], start: int = 0) -> str:
+    """Source of a dict display that takes `keys` from row `r` from `start`."""
+    return "{%s}" % ", ".join(
+        f"{key!r}: r[{index}]" for index, key in enumerate(keys, start)
+    )
+
+
+def _compile(name: str, source: str, namespace: dict | None = None):
+    namespace = dict(namespace or {})
+    exec(source, namespace)
+    return namespace[name]
+
+
+class Serializer:
+    """
+    Serializer of `model` rows, same as `model_to_dict(max_depth=1)` with
+    backrefs: foreign keys as dicts and backrefs as lists of dicts.
+    """
+
+    def __init__(self, model: type[BaseModel]):
+        self.model = model
+        fields = model._meta.sorted_fields  # type: ignore
+        self.columns = list(fields)
+        self.joins = []
+        parts = []
+        for index, field in enumerate(fields):
+            if isinstance(field, ForeignKeyField):
+                rel_fields = field.rel_model._meta.sorted_fields
+                alias = field.rel_model.alias()
+                self.joins.append((alias, field == alias.id))
+                nested = _dict_source([f.name for f in rel_fields], len(self.columns))
+                self.columns.extend(getattr(alias, f.name) for f in rel_fields)
+                parts.append(
+                    f"{field.name!r}: None if r[{index}] is None else {nested}"
+                )
+            else:
+                parts.append(f"{field.name!r}: r[{index}]")
+
+        # related objects of backrefs are at depth 0, just their fields
+        self.backrefs = []
+        for foreign_key, rel_model in model._meta.backrefs.items():  # type: ignore
+            if foreign_key.backref == "+":
+                continue
+            rel_fields = [
+                f for f in rel_model._meta.sorted_fields if f is not foreign_key
+            ]
+            row_to_dict = _compile(
+                "row_to_dict",
+                "def row_to_dict(r):\n    return "
+                + _dict_source([f.name for f in rel_fields]),
+            )
+            self.backrefs.append((foreign_key, rel_fields, row_to_dict))
+            parts.append(
+                f"{foreign_key.backref!r}: b{len(self.backrefs)}.get(r[0], [])"
+            )
+
+        args = "".join(f", b{i}" for i in range(1, len(self.backrefs) + 1))
+        self.source = f"def row_to_dict(r{args}):\n    return {{{', '.join(parts)}}}"
+        self._row_to_dict = _compile("row_to_dict", self.source)
+        self._computed = COMPUTED.get(model)
+
+    def query(self, where=None):
+        query = self.model.select(*self.columns)
+        for alias, on in self.joins:
+            query = query.join_from(self.model, alias, JOIN.LEFT_OUTER, on=on)
+        if where is not None:
+            query = query.where(where)
+        return query.order_by(self.model.id).tuples()  # type: ignore
+
+    def many(self, where=None) -> list[dict]:
+        """Dicts of rows that match `where` (all rows if it is `None`)."""
+        groups = []
+        for foreign_key, rel_fields, row_to_dict in self.backrefs:
+            query = foreign_key.model.select(*rel_fields, foreign_key)
+            if where is None:
+                query = query.where(foreign_key.is_null(False))
+            else:
+                ids = self.model.select(self.model.id).where(where)  # type: ignore
+                query = query.where(foreign_key.in_(ids))
+            group = {}
+            for r in query.order_by(foreign_key.model.id).tuples():
+                if (items := group.get(r[-1])) is None:
+                    items = group[r[-1]] = []
+                items.append(row_to_dict(r))
+            groups.append(group)
+
+        convert, computed = self._row_to_dict, self._computed
+        result = [convert(r, *groups) for r in self.query(where)]
+        if computed is not None:
+            for data in result:
+                data.update(computed(data))
+        return result
+
+    def one(self, instance: BaseModel) -> dict | None:
+        """Dict of `instance` (as it is in database)."""
+        result = self.many(self.model.id == instance.id)  # type: ignore
+        return result[0] if result else None
+
+
+_serializers: dict[type, Serializer] = {}
+
+
+def serializer_for(model: type[BaseModel]) -> Serializer:
+    if (serializer := _serializers.get(model)) is None:
+        serializer = _serializers[model] = Serializer(model)
+    return serializer
+
+
+def serialize(model: type[BaseModel], where=None) -> list[dict]:
+    """Same as `[obj.to_dict(max_depth=1) for obj in model.select().where(where)]`."""
+    return serializer_for(model).many(where)
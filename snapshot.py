@@ -0,0 +1,53 @@
+# this file contains read snapshots of databases. heavy admin reads can be
+# served from an in-memory copy of a course database that is refreshed
+# periodically with sqlite's backup api, so they don't hold locks on the
+# database that check-ins write to.
+
+from __future__ import annotations
+from peewee import SqliteDatabase
+
+import sqlite3
+import threading
+import time
+
+
+class ReadSnapshot:
+    """A read-only in-memory copy of a database, at most `max_age` seconds old."""
+
+    def __init__(self, max_age: float):
+        self.max_age = max_age
+        self.taken_at = 0.0
+        self._lock = threading.Lock()
+        self._database: SqliteDatabase | None = None
+        self._keepalive: sqlite3.Connection | None = None
+        self._generation = 0
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.taken_at
+
+    def get(self, source: SqliteDatabase) -> SqliteDatabase:
+        """Current copy of `source`, takes a new copy if it is too old."""
+        if self._database is None or self.age > self.max_age:
+            # one request refreshes it, others use previous copy meanwhile
+            if self._lock.acquire(blocking=self._database is None):
+                try:
+                    if self._database is None or self.age > self.max_age:
+                        self.refresh(source)
+                finally:
+                    self._lock.release()
+        return self._database  # type: ignore
+
+    def refresh(self, source: SqliteDatabase):
+        self._generation += 1
+        uri = (
+            f"file:kian-snapshot-{id(self)}-{self._generation}?mode=memory&cache=shared"
+        )
+        keepalive = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        source.connection().backup(keepalive)
+        database = SqliteDatabase(uri, uri=True, pragmas={"query_only": 1})
+        # readers of previous copy keep it alive until they close connections
+        previous, self._keepalive = self._keepalive, keepalive
+        self._database, self.taken_at = database, time.monotonic()
+        if previous is not None:
+            previous.close()
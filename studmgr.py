@@ -1,4 +1,4 @@
-from openpyxl import load_workbook
+from __future__ import annotations
 from model import (  # noqa:F401
     database_proxy,
     Student,
@@ -6,23 +6,23 @@ from model import (  # noqa:F401
     Attendance,
     Score,
     Meeting,
+    Change,
     _TABLES_,
 )
-from playhouse.db_url import connect
+from importer import validate_array
+from archive import archive
+from datetime import date
+from courses import load_courses
 from typing import Callable
+import changes
 import json
-import re
+import migrations
 import argparse
+import os
+import sqlite3
 
 config: dict = json.load(open("config.json", "r"))
 
-try:
-    db = connect(config["database"])
-    database_proxy.initialize(db)
-except:  # noqa: E722
-    print("[ERROR] can not connect to database, are you sure you shuted server down?!")
-    exit(99)
-
 
 def get_input(
     condition: Callable,
@@ -50,29 +50,6 @@ def get_input(
             print(error)
 
 
-validate_range_input = re.compile(r"([A-Z]+)(\d+):((\1\d+)|([A-Z]+)\2)")
-
-
-def validate_array(inp, ws, len_match=0):
-    if validate_range_input.fullmatch(inp) is None:
-        return 1
-    start, end = inp.split(":")
-    array = ws[start:end]
-    if len(array) == 1 and len(array[0]) > 1:
-        array = [cell.value for cell in array[0]]
-    elif len(array) > 1 and len(array[0]) == 1:
-        array = [cell[0].value for cell in array]
-    else:
-        return 2
-
-    array = list(filter(None, array))
-    if not array:
-        return 3
-    if len_match > 0 and len(array) != len_match:
-        return 4
-    return 0, array
-
-
 def menu(prompt, *options):
     print(prompt)
     for i, option in enumerate(options, 1):
@@ -92,8 +69,14 @@ def load(file):
             return 1
 
         for table in _TABLES_:
-            table.drop_table()
-    db.create_tables(_TABLES_)
+            if table is not Change:  # clients of change log must know it
+                table.drop_table()
+        if Change.table_exists():
+            changes.reset()
+    from openpyxl import load_workbook
+
+    database_proxy.create_tables(_TABLES_)
+    migrations.migrate(database_proxy.current)  # triggers are dropped with tables
     wb = load_workbook(file)
     if len(wb.sheetnames) > 1:
         index = menu("Choose a worksheet:", *wb.sheetnames)
@@ -139,7 +122,7 @@ def load(file):
 
 
 def add(student_name, student_number):
-    db.create_tables(_TABLES_)
+    database_proxy.create_tables(_TABLES_)
     if Student.get_or_none(Student.number == student_number):
         print(f'[ERROR] A student with number "{student_number}" already existed.')
         return 1
@@ -158,6 +141,55 @@ def add(student_name, student_number):
     return 0
 
 
+def archive_before(before, course):
+    directory = config.get("archive directory", "archives")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{course}-{before}.sqlite")
+    try:
+        result = archive(before, path)
+    except FileExistsError:
+        print(f'[ERROR] Archive "{path}" already existed.')
+        return 1
+    except RuntimeError:
+        print("[ERROR] Meetings are changed while archiving, try again.")
+        return 1
+    if not result["meeting"]:
+        print(f"Nothing to archive, there is no closed meeting before {before}.")
+        return 0
+    print(
+        f'Archived {result["meeting"]} meetings, {result["attendance"]} attendances'
+        f' and {result["score"]} scores to "{path}"'
+    )
+    return 0
+
+
+def backup_course(course):
+    from backup import backup
+
+    path = backup(
+        config.get("backup directory", "backups"),
+        course,
+        keep=config.get("backups to keep", 10),
+    )
+    print(f'Snapshot saved to "{path}"')
+    return verify_snapshot(path)
+
+
+def verify_snapshot(path):
+    from backup import verify
+
+    try:
+        counts = verify(path)
+    except (ValueError, sqlite3.DatabaseError) as e:
+        print(f"[ERROR] Snapshot is not restorable: {e}")
+        return 1
+    print(
+        "Snapshot is restorable: "
+        + ", ".join(f"{count} {table}" for table, count in counts.items())
+    )
+    return 0
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         "studmgr.py", description="This script will import your excel worksheet."
@@ -178,8 +210,51 @@ if __name__ == "__main__":
         metavar=("name", "number"),
         help="manually add a new student to database",
     )
+    group.add_argument(
+        "--archive",
+        metavar="YYYY-MM-DD",
+        type=date.fromisoformat,
+        help="moves closed meetings before this date to an archive database",
+    )
+    group.add_argument(
+        "--backup",
+        action="store_true",
+        help="takes a snapshot of database, it is safe while server is running",
+    )
+    group.add_argument(
+        "--verify",
+        metavar='"snapshot file path"',
+        help="checks a snapshot can be restored",
+    )
+    parser.add_argument(
+        "--course",
+        "-c",
+        metavar="name",
+        help='course to work on (see "courses" in config.json), default is the first one',
+    )
     args = parser.parse_args()
+    if args.verify is not None:
+        exit(verify_snapshot(args.verify))
+
+    courses = load_courses(config)
+    if args.course is not None and args.course not in courses:
+        print(f'[ERROR] course "{args.course}" not found in config.json.')
+        exit(98)
+    course = args.course or next(iter(courses))
+    try:
+        db = courses[course]
+        database_proxy.initialize(db)
+        db.connect()
+    except:  # noqa: E722
+        print(
+            "[ERROR] can not connect to database, are you sure you shuted server down?!"
+        )
+        exit(99)
     if args.load is not None:
         exit(load(args.load))
     if args.add is not None:
         exit(add(*args.add))
+    if args.archive is not None:
+        exit(archive_before(args.archive, course))
+    if args.backup:
+        exit(backup_course(course))
@@ -28,128 +28,282 @@ function login(e) {
 }
 
 var Meetings, Students;
-function renderTable() {
-    let studentsTable = document.getElementById('students-table');
-    if (studentsTable) {
-        animate(studentsTable, 'fade', 'out').then(() => {
-            document.getElementById('students-info').innerHTML = '<h1 class="spinner middle center inline"></h1>';
-        })
+var Analytics = { students: {}, meetings: {} };
+function loadAnalytics() {
+    return request('analytics', undefined, undefined, analytics => {
+        Analytics = { students: {}, meetings: {} };
+        analytics.students.forEach(student => Analytics.students[student.id] = student);
+        analytics.meetings.forEach(meeting => Analytics.meetings[meeting.id] = meeting);
+    });
+}
+
+// entities of the last lists by id, tooltips are rendered from them
+var Entities = { meetings: {}, students: {}, attendances: {}, scores: {}, devices: {} };
+function cacheEntities(meetings, students) {
+    Entities = { meetings: {}, students: {}, attendances: {}, scores: {}, devices: {} };
+    meetings.forEach(meeting => Entities.meetings[meeting.id] = meeting);
+    students.forEach(student => {
+        Entities.students[student.id] = student;
+        student.devices.forEach(device => Entities.devices[device.id] = Object.assign({ student: student.id }, device));
+        student.attendances.forEach(attendance => Entities.attendances[attendance.id] = Object.assign({ student: student.id }, attendance));
+        student.scores.forEach(score => Entities.scores[score.id] = Object.assign({ student: student.id }, score));
+    });
+    loadMissingDevices();
+}
+
+// a student may have attended with a device of another one, just those
+// devices are loaded (BATCH_SIZE of app.py ids per request)
+function loadMissingDevices() {
+    let entities = Entities;
+    let missing = new Set();
+    Object.values(entities.attendances).forEach(attendance => {
+        if (!(attendance.device in entities.devices))
+            missing.add(attendance.device);
+    });
+    missing = Array.from(missing);
+    for (let i = 0; i < missing.length; i += 500) {
+        request('devices/batch', { ids: missing.slice(i, i + 500).join(',') }, undefined, (devices) => {
+            // like other entities, `student` is just the id
+            devices.forEach(device => entities.devices[device.id] = Object.assign({}, device, { student: device.student && device.student.id }));
+        });
     }
+}
+
+function renderTable() {
+    loadAnalytics();
     request('meetings', undefined, undefined, (meetings) => {
-        Meetings = meetings;
         request('students', undefined, undefined, (students) => {
+            Meetings = meetings;
+            Students = students;
+            cacheEntities(meetings, students);
             if (students.length > 0) {
-                Students = students;
-                const studentsTable = createTable(meetings, students);
-                document.getElementById('students-info').replaceChildren(div({ id: "table-container", cls: ['block', 'center'] }, studentsTable));
+                updateTable(meetings, students);
             } else {
+                Grid = null;
                 document.getElementById('students-info').replaceChildren(div({ cls: ['middle', 'center', 'block'] },
                     p(undefined, 'Your class is empty!'),
-                    small(undefined, 'to add students shutdown server, go to app root and<br>run <code>python studmgr.py load &lt;yourfile&gt;</code> and<br>then restart the server, <a href="https://github.com/bsimjoo-official/kian">more info</a>')      // TODO: add document for this
+                    small(undefined, 'to add students import an excel (xlsx) or csv file, enter ranges of names and numbers (e.g. A2:A40 and B2:B40)'),
+                    createElement('form', { id: 'import-form', onsubmit: 'return importStudents(event)' },
+                        createElement('input', { type: 'file', name: 'file', accept: '.xlsx,.csv' }),
+                        createElement('input', { name: 'names', placeholder: 'names (A2:A40)' }),
+                        createElement('input', { name: 'numbers', placeholder: 'numbers (B2:B40)' }),
+                        createElement('button', { type: 'submit' }, 'Import'))
                 ));
             }
         })
     })
 }
 
-function createTable(meetings, students) {
-    let rowCounter = 1;
-    return table({ id: 'students-table', cls: 'students-table' },
-        thead(undefined,
-            tr(undefined,
-                td(undefined, 'No.'),
-                td(undefined, 'Students'),
-                meetings.length > 0 ?
-                    meetings.map(meeting => {
-                        let meetingTime;
-                        if (!meeting.in_progress) {
-                            let start_at = meeting.start_at.split(':').slice(0, 2).join(':');
-                            let end_at = meeting.end_at !== null ? meeting.end_at.split(':').slice(0, 2).join(':') : 'N/A';
-                            meetingTime = small({ cls: 'meeting-time' }, start_at, '-', end_at);
-                        } else
-                            meetingTime = small({ cls: 'in-process' }, 'in-process');
-                        let meetingTd = td({ id: 'meet-' + meeting.id, cls: 'meeting' }, meeting.date, '<br>', meetingTime);
-                        meetingTd.setAttribute('colspan', 2);
-                        meetingTd.dataset.meetingId = meeting.id;
-                        attachTooltip(meetingTd, () => [
-                            p(undefined, span({ cls: 'secondary-text' }, 'Date: '), meeting.date),
-                            p(undefined, span({ cls: 'secondary-text' }, 'Count of attendance: '), meeting.count_of_attendances),
-                            p(undefined, span({ cls: 'secondary-text' }, 'Participation percentage: '), textNode(meeting.count_of_attendances / students.length * 100 + '%')),
-                            p(undefined, span({ cls: 'secondary-text' }, 'Started at: '), meeting.start_at),
-                            (meeting.in_process ?
+// just the visible rows of students table (and GRID_BUFFER rows around them)
+// are in the document, rows are built on first show and kept until the data
+// of their student changes.
+const GRID_BUFFER = 10;
+var Grid = null;
+
+function updateTable(meetings, students) {
+    let header = JSON.stringify(meetings.map(meeting => [meeting.id, meeting.date, meeting.start_at, meeting.end_at, meeting.in_progress]));
+    if (Grid === null || Grid.header !== header || !document.body.contains(Grid.table))
+        Grid = createGrid(meetings, header);
+    let rows = new Map();
+    students.forEach((student, index) => {
+        let key = index + JSON.stringify(student);
+        let row = Grid.rows.get(student.id);
+        rows.set(student.id, row && row.key === key ? row : { key: key, elem: null });
+    });
+    Grid.rows = rows;
+    Grid.students = students;
+    renderRows(true);
+}
+
+function createGrid(meetings, header) {
+    let grid = {
+        header: header, meetings: meetings, students: [], rows: new Map(),
+        rowHeight: 0, first: -1, last: -1, chosen: null
+    };
+    grid.body = tbody();
+    grid.table = table({ id: 'students-table', cls: 'students-table' }, createHeader(meetings), grid.body);
+    grid.container = div({ id: "table-container", cls: ['block', 'center'] }, grid.table);
+    grid.container.onscroll = () => {
+        if (!grid.frame)
+            grid.frame = requestAnimationFrame(() => { grid.frame = null; renderRows(); });
+    };
+    document.getElementById('students-info').replaceChildren(grid.container);
+    return grid;
+}
+
+function rowElement(index) {
+    let student = Grid.students[index];
+    let row = Grid.rows.get(student.id);
+    if (row.elem === null) {
+        row.elem = createRow(Grid.meetings, student, index);
+        if (Grid.chosen === student.id)
+            row.elem.classList.add('randomly-chosen');
+    }
+    return row.elem;
+}
+
+function spacer(height) {
+    let cell = td();
+    cell.setAttribute('colspan', Grid.meetings.length * 2 + 3);
+    let row = tr({ cls: 'spacer' }, cell);
+    row.style.height = height + 'px';
+    return row;
+}
+
+function renderRows(force = false) {
+    let count = Grid.students.length;
+    if (!Grid.rowHeight) {
+        Grid.body.replaceChildren(rowElement(0));
+        Grid.rowHeight = Grid.body.firstChild.offsetHeight || 30;
+    }
+    let top = Math.max(Grid.container.scrollTop - Grid.table.tHead.offsetHeight, 0);
+    let first = Math.max(Math.floor(top / Grid.rowHeight) - GRID_BUFFER, 0);
+    let last = Math.min(Math.ceil((top + Grid.container.clientHeight) / Grid.rowHeight) + GRID_BUFFER, count);
+    // rows are striped by nth-child, so after the top spacer an odd row must come
+    if (first > 0 && first % 2 === 0)
+        first--;
+    if (!force && first === Grid.first && last === Grid.last)
+        return;
+    Grid.first = first;
+    Grid.last = last;
+    let children = [];
+    if (first > 0)
+        children.push(spacer(first * Grid.rowHeight));
+    for (let index = first; index < last; index++)
+        children.push(rowElement(index));
+    if (last < count)
+        children.push(spacer((count - last) * Grid.rowHeight));
+    Grid.body.replaceChildren(...children);
+}
+
+function createHeader(meetings) {
+    return thead(undefined,
+        tr(undefined,
+            td(undefined, 'No.'),
+            td(undefined, 'Students'),
+            meetings.length > 0 ?
+                meetings.map(meeting => {
+                    let meetingTime;
+                    if (!meeting.in_progress) {
+                        let start_at = meeting.start_at.split(':').slice(0, 2).join(':');
+                        let end_at = meeting.end_at !== null ? meeting.end_at.split(':').slice(0, 2).join(':') : 'N/A';
+                        meetingTime = small({ cls: 'meeting-time' }, start_at, '-', end_at);
+                    } else
+                        meetingTime = small({ cls: 'in-process' }, 'in-process');
+                    let meetingTd = td({ id: 'meet-' + meeting.id, cls: 'meeting' }, meeting.date, '<br>', meetingTime);
+                    meetingTd.setAttribute('colspan', 2);
+                    meetingTd.dataset.meetingId = meeting.id;
+                    attachTooltip(meetingTd, () => {
+                        let current = Entities.meetings[meeting.id] || meeting;
+                        return [
+                            p(undefined, span({ cls: 'secondary-text' }, 'Date: '), current.date),
+                            p(undefined, span({ cls: 'secondary-text' }, 'Count of attendance: '), textNode(current.count_of_attendances)),
+                            p(undefined, span({ cls: 'secondary-text' }, 'Participation percentage: '), textNode((Analytics.meetings[meeting.id] || {}).turnout + '%')),
+                            p(undefined, span({ cls: 'secondary-text' }, 'Late arrivals: '), textNode((Analytics.meetings[meeting.id] || {}).late)),
+                            p(undefined, span({ cls: 'secondary-text' }, 'Started at: '), current.start_at),
+                            (current.in_process ?
                                 p(undefined, span({ cls: 'in-process' }, 'Meeting is in-process')) :
-                                p(undefined, span({ cls: 'secondary-text' }, 'Ended at: '), meeting.end_at)
+                                p(undefined, span({ cls: 'secondary-text' }, 'Ended at: '), current.end_at)
                             )
-                        ]);
-                        return meetingTd;
-                    }) :
-                    td(undefined, 'No meeting, start a meeting to add here')
-                ,
-                td(undefined, 'Total scores')
-            )
-        ),
-        tbody(undefined,
-            students.map(student => {
-                let student_td = td({ id: 'stdname-' + student.id, cls: 'student-name' }, student.name);
-                attachTooltip(student_td, () => request('students/' + student.id, res => res).then(student => [
+                        ];
+                    });
+                    return meetingTd;
+                }) :
+                td(undefined, 'No meeting, start a meeting to add here')
+            ,
+            td(undefined, 'Total scores')
+        )
+    );
+}
+
+function createRow(meetings, student, index) {
+    let student_td = td({ id: 'stdname-' + student.id, cls: 'student-name' }, student.name);
+    attachTooltip(student_td, () => {
+        let current = Entities.students[student.id] || student;
+        let analytics = Analytics.students[student.id] || {};
+        return [
+            p(undefined, span({ cls: 'secondary-text' }, 'Name: '), current.name),
+            p(undefined, span({ cls: 'secondary-text' }, 'Number: '), current.number),
+            p(undefined, span({ cls: 'secondary-text' }, 'Score: '), current.total_score.toString() + ' / ' + current.total_full_score.toString()),
+            p(undefined, span({ cls: 'secondary-text' }, 'Participation percentage: '), textNode(analytics.participation + '%')),
+            p(undefined, span({ cls: 'secondary-text' }, 'Number of absences: '), textNode(analytics.absences)),
+            p(undefined, span({ cls: 'secondary-text' }, 'Late arrivals: '), textNode(analytics.late)),
+            p(undefined, span({ cls: 'secondary-text' }, 'Attendance streak: '), textNode(analytics.current_streak)),
+            p(undefined, span({ cls: 'secondary-text' }, 'Count of devices: '), textNode(current.devices.length))
+        ];
+    });
+    return tr({ id: 'std-' + student.id, cls: 'student' },
+        td(undefined, (index + 1).toString()),
+        student_td,
+        ...(meetings.length > 0 ? meetings.map(meeting => {
+            let attendance = student.attendances.find(a => a.meeting === meeting.id);
+            let score = student.scores.find(s => s.meeting === meeting.id);
+            let score_td = td({ cls: ['score', 'empty'] }, '-');
+            let attendance_td = td({ cls: 'attendance' }, '<i class="absent fa-solid fa-circle-xmark"></i>');
+            if (typeof (attendance) !== 'undefined') {
+                attendance_td = td({ id: 'att-' + attendance.id, cls: 'attendance' }, '<i class="present fa-solid fa-circle-check"></i>');
+                attachTooltip(attendance_td, () => {
+                    let current = Entities.attendances[attendance.id] || attendance;
+                    let device = Entities.devices[current.device];
+                    return [
+                        p(undefined, span({ cls: 'secondary-text' }, 'Name: '), (Entities.students[current.student] || student).name),
+                        p(undefined, span({ cls: 'secondary-text' }, 'Device: '), !device ? textNode('#' + current.device) : device.student === current.student ? device.mac : textNode(device.mac, '(not registered to this student)')),
+                        p(undefined, span({ cls: 'secondary-text' }, 'Time: '), current.time)
+                    ];
+                })
+            }
+            if (typeof (score) !== 'undefined') {
+                score_td = td({ id: 'scr-' + score.id, cls: 'score' }, score.score.toString(), ' / ', score.full_score.toString());
+                attachTooltip(score_td, () => [
                     p(undefined, span({ cls: 'secondary-text' }, 'Name: '), student.name),
                     p(undefined, span({ cls: 'secondary-text' }, 'Number: '), student.number),
-                    p(undefined, span({ cls: 'secondary-text' }, 'Score: '), student.total_score.toString() + ' / ' + student.total_full_score.toString()),
-                    p(undefined, span({ cls: 'secondary-text' }, 'Participation percentage: '), textNode(student.attendances.length / meetings.length * 100 + '%')),
-                    p(undefined, span({ cls: 'secondary-text' }, 'Number of absences: '), textNode(meetings.length - student.attendances.length)),
-                    p(undefined, span({ cls: 'secondary-text' }, 'Count of devices: '), textNode(student.devices.length))
-                ]))
-                return tr({ id: 'std-' + student.id, cls: 'student' },
-                    td(undefined, (rowCounter++).toString()),
-                    student_td,
-                    ...(meetings.length > 0 ? meetings.map(meeting => {
-                        let attendance = student.attendances.find(a => a.meeting === meeting.id);
-                        let score = student.scores.find(s => s.meeting === meeting.id);
-                        let score_td = td({ cls: ['score', 'empty'] }, '-');
-                        let attendance_td = td({ cls: 'attendance' }, '<i class="absent fa-solid fa-circle-xmark"></i>');
-                        if (typeof (attendance) !== 'undefined') {
-                            attendance_td = td({ id: 'att-' + attendance.id, cls: 'attendance' }, '<i class="present fa-solid fa-circle-check"></i>');
-                            attachTooltip(attendance_td, () => {
-                                return request('attendances/' + attendance.id, undefined, undefined, (res) => res).then(res => [
-                                    p(undefined, span({ cls: 'secondary-text' }, 'Name: '), res.student.name),
-                                    p(undefined, span({ cls: 'secondary-text' }, 'Device: '), res.device.mac),
-                                    p(undefined, span({ cls: 'secondary-text' }, 'Time: '), res.time)
-                                ]
-                                )
-                            })
-                        }
-                        if (typeof (score) !== 'undefined') {
-                            score_td = td({ id: 'scr-' + score.id, cls: 'score' }, score.score.toString(), ' / ', score.full_score.toString());
-                            attachTooltip(score_td, () => [
-                                p(undefined, span({ cls: 'secondary-text' }, 'Name: '), student.name),
-                                p(undefined, span({ cls: 'secondary-text' }, 'Number: '), student.number),
-                                p(undefined, span({ cls: 'secondary-text' }, 'Score: '), score.score),
-                                p(undefined, span({ cls: 'secondary-text' }, 'Full-score: '), score.full_score),
-                                p(undefined, span({ cls: 'secondary-text' }, 'Reason: '), score.reason || "")
-                            ]);
-                        } else
-                            score = { id: null, score: 0, full_score: 0, reason: "" }
-                        score_td.onclick = e => {
-                            let dialog = document.getElementById('score-dlg');
-                            dialog.dataset.scoreId = score.id;
-                            dialog.dataset.meetingId = meeting.id;
-                            dialog.dataset.studentId = student.id;
-                            document.getElementById('scr-dlg-name').innerText = student.name;
-                            document.getElementById('scr-dlg-number').innerText = student.number;
-                            document.getElementById('scr-dlg-meeting').innerText = meeting.date;
-                            dialog.score.value = score.score;
-                            dialog.fullScore.value = score.full_score;
-                            dialog.reason.value = score.reason || "";
-                            show_dialog(dialog);
-                        }
-                        return [attendance_td, score_td];
-                    }) : [td(undefined, '')]),
-                    td({ id: 'ttlscr-' + student.id, cls: 'student-score' }, student.total_score.toString() + ' / ' + student.total_full_score.toString())
-                )
+                    p(undefined, span({ cls: 'secondary-text' }, 'Score: '), textNode(score.score)),
+                    p(undefined, span({ cls: 'secondary-text' }, 'Full-score: '), textNode(score.full_score)),
+                    p(undefined, span({ cls: 'secondary-text' }, 'Reason: '), score.reason || "")
+                ]);
+            } else
+                score = { id: null, score: 0, full_score: 0, reason: "" }
+            score_td.onclick = e => {
+                let dialog = document.getElementById('score-dlg');
+                dialog.dataset.scoreId = score.id;
+                dialog.dataset.meetingId = meeting.id;
+                dialog.dataset.studentId = student.id;
+                document.getElementById('scr-dlg-name').innerText = student.name;
+                document.getElementById('scr-dlg-number').innerText = student.number;
+                document.getElementById('scr-dlg-meeting').innerText = meeting.date;
+                dialog.score.value = score.score;
+                dialog.fullScore.value = score.full_score;
+                dialog.reason.value = score.reason || "";
+                show_dialog(dialog);
             }
-            )
-        )
-    )
+            return [attendance_td, score_td];
+        }) : [td(undefined, '')]),
+        td({ id: 'ttlscr-' + student.id, cls: 'student-score' }, student.total_score.toString() + ' / ' + student.total_full_score.toString())
+    );
+}
+
+function waitJob(job, callback) {
+    if (job.status === 'queued' || job.status === 'running')
+        return sleep(500).then(() => request('jobs/' + job.id, undefined, undefined, (job) => waitJob(job, callback)));
+    return callback(job);
+}
+
+function importStudents(e) {
+    e.preventDefault();
+    let form = e.currentTarget;
+    fetch('/api/v1/students/import', { method: 'POST', body: new FormData(form) })
+        .then((res) => res.json().then((body) => {
+            if (res.status !== 202)
+                return show_msg('error', body.info);
+            show_msg('info', 'Importing students...');
+            waitJob(body, (job) => {
+                if (job.status !== 'done')
+                    return show_msg('error', 'Import failed: ' + job.message);
+                show_msg('success', `${job.result.inserted} students imported`);
+                renderTable();
+            });
+        }));
+    return false;
 }
 
 function endMeeting() {
@@ -192,12 +346,15 @@ function startMeeting() {
 }
 
 function chooseRandom() {
-    if (document.getElementsByClassName('randomly-chosen').length == 1)
-        document.getElementsByClassName('randomly-chosen')[0].classList.remove('randomly-chosen');
-    let students = document.getElementById('students-table').getElementsByTagName('tbody')[0].children;
-    let rnd = getRndInteger(0, students.length - 1);
-    students[rnd].classList.add('randomly-chosen');
-    students[rnd].scrollIntoView({ behavior: "smooth", block: "center", inline: "nearest" });
+    Grid.rows.forEach(row => row.elem && row.elem.classList.remove('randomly-chosen'));
+    let rnd = getRndInteger(0, Students.length - 1);
+    Grid.chosen = Students[rnd].id;
+    // row may not be rendered yet, scroll to its place and render it
+    Grid.container.scrollTop = Grid.table.tHead.offsetHeight + rnd * Grid.rowHeight - Grid.container.clientHeight / 2;
+    renderRows();
+    let row = rowElement(rnd);
+    row.classList.add('randomly-chosen');
+    row.scrollIntoView({ behavior: "smooth", block: "center", inline: "nearest" });
     show_msg('info', `chosen student number ${rnd + 1} -> ${Students[rnd].name}`)
 }
 
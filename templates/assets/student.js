@@ -20,6 +20,9 @@ function register() {
                 document.getElementById('student-code').classList.add('error');
                 show_msg('error', 'Error: Student does not exist, check the student number');
             },
+            423: (res) => {
+                show_msg('error', 'Your device is blocked, ask your teacher');
+            },
             403: (res) => {
                 show_msg('warning', 'Your device is already registered');
                 console.log(res);
@@ -55,6 +58,10 @@ function attendance(stdNum, retry = false) {
                         .then(() => sleep(1000))
                         .then(slide(0));
                 },
+                423: (res) => {
+                    show_msg('error', 'Your device is blocked, ask your teacher', 20000);
+                    type_text(pre('keyword', 'raise ') + pre('class', 'AssertionError') + '(' + pre('string', '"423 ERROR"') + ')');
+                },
                 404: (res) => {
                     show_msg('error', 'session did not start, try again after teacher start new session', 20000);
                     type_text(pre('keyword', 'raise ') + pre('class', 'AssertionError') + '(' + pre('string', '"404 ERROR"') + ')')
@@ -0,0 +1,12 @@
+import pytest
+from model import database_proxy, _TABLES_
+from peewee import SqliteDatabase
+
+
+@pytest.fixture()
+def db():
+    """An empty in-memory database that models are routed to."""
+    db = SqliteDatabase(":memory:")
+    with database_proxy.routed(db):
+        db.create_tables(_TABLES_)
+        yield db
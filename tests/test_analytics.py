@@ -0,0 +1,56 @@
+from datetime import date, time
+from model import database_proxy, Student, Device, Attendance, Meeting
+from cache import GenerationCache
+import analytics
+
+
+def test_analytics(db):
+    late, punctual, absent = (
+        Student.create(name=name, number=str(number))
+        for number, name in enumerate(["BSimjoo", "Evan Alexander", "Jane Doe"])
+    )
+    device = Device.create(mac="00:00:00:00:00:01")
+    meetings = [
+        Meeting.create(date=date(2023, 1, day), start_at=time(10), in_progress=False)
+        for day in range(1, 6)
+    ]
+    for i, meeting in enumerate(meetings):
+        if i != 2:
+            Attendance.create(
+                student=late, device=device, meeting=meeting, time=time(10, 20)
+            )
+        Attendance.create(
+            student=punctual, device=device, meeting=meeting, time=time(10, 5)
+        )
+
+    result = analytics.analytics(grace=10)
+    students = {student["id"]: student for student in result["students"]}
+    assert students[late.id]["attendances"] == 4
+    assert students[late.id]["participation"] == 80
+    assert students[late.id]["late"] == 4
+    assert students[late.id]["longest_streak"] == 2
+    assert students[late.id]["current_streak"] == 2
+    assert students[punctual.id]["late"] == 0
+    assert students[punctual.id]["current_streak"] == 5
+    assert students[absent.id]["absences"] == 5
+    assert students[absent.id]["longest_streak"] == 0
+    assert [m["attendances"] for m in result["meetings"]] == [2, 2, 1, 2, 2]
+    assert [m["late"] for m in result["meetings"]] == [1, 1, 0, 1, 1]
+    assert result["meetings"][2]["turnout"] == 33.3
+    assert result["meetings"][0]["first_arrival"] == time(10, 5)
+    assert analytics.analytics(grace=30)["meetings"][0]["late"] == 0
+
+
+def test_generation_cache(db):
+    cache = GenerationCache()
+    compute = lambda: Student.select().count()  # noqa: E731
+    assert cache.get_or_compute("students", compute) == 0
+    Student.insert(name="BSimjoo", number="123456789").execute()
+    generation = database_proxy.generation()
+    assert cache.get_or_compute("students", compute) == 1
+    Student.select().count()  # reads don't change generation
+    assert database_proxy.generation() == generation
+    with database_proxy.atomic():
+        Student.create(name="Evan Alexander", number="123456790")
+    assert database_proxy.generation() != generation
+    assert cache.get_or_compute("students", compute) == 2
@@ -0,0 +1,26 @@
+from model import Student, Device, Attendance, Meeting
+import anomalies
+
+
+def test_analyze(db):
+    owner = Student.create(name="BSimjoo", number="123456789")
+    friend = Student.create(name="Evan Alexander", number="123456790")
+    phone = Device.create(mac="00:00:00:00:00:01", student=owner)
+    blocked = Device.create(mac="00:00:00:00:00:02", student=friend, blocked=True)
+    Device.create(mac="00:00:00:00:00:03", student=owner)
+    meeting = Meeting.create(in_progress=False)
+    Attendance.create(student=owner, device=phone, meeting=meeting)
+    Attendance.create(student=friend, device=phone, meeting=meeting)
+    Attendance.create(student=friend, device=blocked, meeting=meeting)
+
+    assert anomalies.analyze(meeting) == 3
+    assert anomalies.analyze_all() == 3  # replaces findings of the meeting
+    report = anomalies.report()
+    assert [(r["device"], r["count"]) for r in report["shared_device"]] == [
+        (phone.id, 2)
+    ]
+    assert [(r["device"], r["student"]) for r in report["foreign_device"]] == [
+        (phone.id, friend.id)
+    ]
+    assert [r["device"] for r in report["blocked_device"]] == [blocked.id]
+    assert report["many_devices"] == [{"student": owner.id, "count": 2}]
@@ -15,8 +15,12 @@ from typing import Any
 from datetime import date, time
 from random import choices, randrange, choice
 import os
+import io
+import gzip
+from time import sleep
 from os.path import exists
 from flask.testing import FlaskClient
+import changes
 
 
 def gen_mac():
@@ -76,15 +80,20 @@ students: list[dict[str, Any]] = [
     },
 ]
 
+# Evan Alexander has an attendance at least, so tests can check that
+# students can't see attendances of other ones
 for student in students:
-    student["devices"] = [{"mac": gen_mac()} for _ in range(randrange(10))]
+    least = int(student is students[1])
+    student["devices"] = [{"mac": gen_mac()} for _ in range(randrange(least, 10))]
 
 
 scores = []
 for student in students:
+    least = int(student is students[1])
     student["attendances"] = []
     if student["devices"]:
-        for meeting in choices(range(1, len(meetings)), k=randrange(len(meetings))):
+        count = randrange(least, len(meetings))
+        for meeting in choices(range(1, len(meetings)), k=count):
             device = choice(student["devices"])
             student["attendances"].append({"device": device, "meeting": meeting})
 
@@ -203,6 +212,21 @@ def test_get_data_from_database(db):
             Device.get(Device.mac == device["mac"])
 
 
+def test_database_routing(db):
+    from cache import present, roster
+
+    course_db = connect("sqlite:///:memory:")
+    with database_proxy.routed(course_db):
+        course_db.create_tables(_TABLES_)
+        assert Student.select().count() == 0
+        assert roster.student(students[0]["number"]) is None
+        assert database_proxy.current is course_db
+        course_present = present.get()
+    assert Student.select().count() == len(students)
+    assert roster.student(students[0]["number"]) is not None
+    assert present.get() is not course_present
+
+
 class TestLogin:
     @pytest.fixture(scope="class")
     def test_client(self, mv_db, config):
@@ -334,6 +358,13 @@ class TestAPI:
         res = test_client.get("api/v1/register?stud_num=987654321")
         assert res.status_code == 403
 
+    def test_roster_index(self, test_client):
+        from cache import roster
+
+        assert roster.student("123456789").name == "BSimjoo"  # type: ignore
+        assert roster.student("546789123") is None
+        assert roster.device("local").student.id == students[0]["id"]  # type: ignore
+
     def test_whoami_after_register(self, test_client):
         res = test_client.get("/api/v1/whoami")
         assert res.status_code == 200
@@ -476,6 +507,15 @@ class TestAPI:
         assert res.is_json
         assert "student" in res.json and "meetings" in res.json
 
+    def test_get_absents(self, test_client: FlaskClient):
+        res = test_client.get("api/v1/current_meeting/absents")
+        assert res.status_code == 200
+        assert res.is_json
+        assert res.json["count_of_attendances"] == 1
+        assert [std["id"] for std in res.json["absents"]] == [
+            student["id"] for student in students[1:]
+        ]
+
     def test_get_students(self, test_client: FlaskClient):
         res = test_client.get("api/v1/students")
         assert res.status_code == 200
@@ -632,3 +672,363 @@ class TestAPI:
     def test_get_current_meeting_again(self, test_client: FlaskClient):
         res = test_client.get("/api/v1/current_meeting")
         assert res.status_code == 404
+
+    def test_add_scores(self, test_client: FlaskClient, common_vars):
+        meeting = common_vars.current_meeting["id"]
+        res = test_client.post(
+            "/api/v1/scores",
+            json=[
+                {"student": student["id"], "score": 1, "meeting": meeting}
+                for student in students
+            ],
+        )
+        assert res.status_code == 200
+        assert [score["student"]["id"] for score in res.json] == [
+            student["id"] for student in students
+        ]
+
+        res = test_client.post("/api/v1/scores", json=[{"student": students[0]["id"]}])
+        assert res.status_code == 400
+        assert res.json["errors"] == ["$[0]: 'score' is a required property"]
+
+        res = test_client.post("/api/v1/scores", json=[{"student": 1000, "score": 1}])
+        assert res.status_code == 404
+
+    def test_leaderboard(self, test_client: FlaskClient):
+        res = test_client.get("/api/v1/leaderboard?limit=3").json
+        totals = sorted(
+            (Student.get_by_id(s["id"]).total_score for s in students), reverse=True
+        )
+        assert res["students"] == len(students)  # type: ignore
+        assert [s["total_score"] for s in res["leaders"]] == totals[:3]  # type: ignore
+        leader = res["leaders"][0]  # type: ignore
+        rank = test_client.get(f"/api/v1/students/{leader['id']}/rank").json
+        assert rank["rank"] == 1 and rank["percentile"] == 100  # type: ignore
+        res = test_client.get("/api/v1/leaderboard?by=normalized").json
+        assert [s["normalized_rank"] for s in res["leaders"]] == sorted(  # type: ignore
+            s["normalized_rank"] for s in res["leaders"]  # type: ignore
+        )
+        assert test_client.get("/api/v1/leaderboard?by=foo").status_code == 400
+        assert test_client.get("/api/v1/students/1000/rank").status_code == 404
+
+    def test_student_summary(self, test_client: FlaskClient):
+        student = students[0]
+        res = test_client.get(f"/api/v1/students/{student['id']}")
+        assert res.status_code == 200
+        summary = res.json["summary"]  # type: ignore
+        assert summary["meetings"] == len(meetings) + 1
+        assert summary["attendances"] == len(student["attendances"]) + 1
+        assert summary["absences"] == summary["meetings"] - summary["attendances"]
+        # score of test_add_scores is included, so cache is invalidated
+        assert summary["total_score"] == sum(s["score"] for s in student["scores"]) + 1
+        assert summary["last_attendances"] == res.json["attendances"][-5:]  # type: ignore
+        assert test_client.get("/api/v1/students/1000").status_code == 404
+
+    def test_attendances_range(self, test_client: FlaskClient):
+        everything = test_client.get("/api/v1/attendances").json
+        day = meetings[1]["date"]
+        res = test_client.get(f"/api/v1/attendances?since={day}&until={day}T23:59")
+        assert res.status_code == 200
+        in_day = {m["id"] for m in test_client.get("/api/v1/meetings").json if m["date"] == day.isoformat()}  # type: ignore
+        assert res.json == [a for a in everything if a["meeting"]["id"] in in_day]  # type: ignore
+        assert test_client.get("/api/v1/attendances?since=yesterday").status_code == 400
+
+    def test_batch_lookup(self, test_client: FlaskClient):
+        # has attendance of test_attendance_after_registration at least
+        student = test_client.get(f"/api/v1/students/{students[0]['id']}").json
+        ids = ",".join(str(a["id"]) for a in student["attendances"])
+        res = test_client.get(f"/api/v1/attendances/batch?ids={ids},100000")
+        assert res.status_code == 200
+        assert [a["id"] for a in res.json] == [a["id"] for a in student["attendances"]]  # type: ignore
+        assert res.json[0] == test_client.get(f"/api/v1/attendances/{res.json[0]['id']}").json  # type: ignore
+        res = test_client.get(
+            f"/api/v1/students/batch?ids={student['id']},{students[1]['id']}"
+        )
+        assert [s["id"] for s in res.json] == [student["id"], students[1]["id"]]  # type: ignore
+        assert test_client.get("/api/v1/devices/batch?ids=a,b").status_code == 400
+        assert test_client.get("/api/v1/devices/batch").status_code == 400
+        # students just get their own rows
+        with test_client.session_transaction() as session:
+            session["admin"] = False
+        try:
+            res = test_client.get(
+                f"/api/v1/students/batch?ids={student['id']},{students[1]['id']}"
+            )
+            assert [s["id"] for s in res.json] == [student["id"]]  # type: ignore
+            mine = student["attendances"][0]["id"]
+            assert test_client.get(f"/api/v1/attendances/{mine}").status_code == 200
+            assert students[1]["attendances"]
+            for theirs in (a["id"] for s in students[1:] for a in s["attendances"]):
+                res = test_client.get(f"/api/v1/attendances/{theirs}")
+                assert res.status_code == 401
+            assert test_client.get("/api/v1/devices/100000").status_code == 401
+            other = students[1]["id"]
+            assert test_client.get(f"/api/v1/students/{other}").status_code == 401
+        finally:
+            with test_client.session_transaction() as session:
+                session["admin"] = True
+
+    def test_get_absents_after_end(self, test_client: FlaskClient):
+        res = test_client.get("/api/v1/current_meeting/absents")
+        assert res.status_code == 404
+
+    def test_anomalies(self, test_client: FlaskClient):
+        res = test_client.post("/api/v1/anomalies")
+        assert res.status_code == 200
+        # BSimjoo has a "local" device too
+        assert [row["student"] for row in res.json["many_devices"]] == [  # type: ignore
+            student["id"]
+            for student in students
+            if len(student["devices"]) + (student is students[0]) >= 2
+        ]
+        assert res.json["shared_device"] == []  # type: ignore
+        assert test_client.get("/api/v1/anomalies").json == res.json
+
+    def test_analytics(self, test_client: FlaskClient):
+        res = test_client.get("/api/v1/analytics")
+        assert res.status_code == 200
+        result = {student["id"]: student for student in res.json["students"]}  # type: ignore
+        for student in test_client.get("/api/v1/students").json:  # type: ignore
+            assert result[student["id"]]["attendances"] == len(student["attendances"])
+        assert test_client.get("/api/v1/analytics").json == res.json
+        compressed = test_client.get(
+            "/api/v1/analytics", headers={"Accept-Encoding": "gzip"}
+        )
+        assert compressed.headers["Content-Encoding"] == "gzip"
+        assert json.loads(gzip.decompress(compressed.data)) == res.json
+        metrics = test_client.get("/api/v1/metrics").json["compression"]  # type: ignore
+        assert metrics["responses"] >= 1 and metrics["ratio"] > 1
+
+    def test_changes(self, test_client: FlaskClient, monkeypatch):
+        seq = test_client.get("/api/v1/changes").json["seq"]  # type: ignore
+        res = test_client.post(
+            "/api/v1/scores", json=[{"student": students[0]["id"], "score": 2}]
+        )
+        res = test_client.get(f"/api/v1/changes?since={seq}").json
+        assert res["seq"] > seq and not res["reset"]  # type: ignore
+        assert [s["score"] for s in res["changed"]["score"]] == [2]  # type: ignore
+        assert (
+            test_client.get(f"/api/v1/changes?since={res['seq']}").json[  # type: ignore
+                "changed"
+            ]
+            == {}
+        )
+        # there is no trigger in other databases
+        monkeypatch.setattr(changes, "triggers", lambda database: {})
+        assert test_client.get("/api/v1/changes").status_code == 501
+
+    def test_schedule(self, test_client: FlaskClient):
+        res = test_client.get("/api/v1/schedule")
+        assert res.status_code == 200 and res.json["slots"] == []  # type: ignore
+
+    def test_block_device(self, test_client: FlaskClient):
+        devices = test_client.get("/api/v1/devices").json
+        local = next(device for device in devices if device["mac"] == "local")  # type: ignore
+        url = f"/api/v1/devices/{local['id']}/block"
+        owner = f"/api/v1/students/{local['student']['id']}"
+        test_client.get(owner)  # dict of student is cached
+        res = test_client.post(url, json={"blocked": True})
+        assert res.status_code == 200 and res.json["blocked"]  # type: ignore
+        student = test_client.get(owner).json
+        assert next(d for d in student["devices"] if d["id"] == local["id"])["blocked"]  # type: ignore
+        assert test_client.get("/api/v1/register").status_code == 423
+        assert test_client.post(url, json={"blocked": False}).status_code == 200
+        assert test_client.get("/api/v1/register").status_code == 403
+        assert test_client.post(url, json={"blocked": 1}).status_code == 400
+
+    def test_jobs(self, test_client: FlaskClient):
+        res = test_client.post("/api/v1/jobs", json={"kind": "anomalies"})
+        assert res.status_code == 202
+        url = f"/api/v1/jobs/{res.json['id']}"  # type: ignore
+        for _ in range(500):
+            if (job := test_client.get(url).json)["status"] == "done":  # type: ignore
+                break
+            sleep(0.01)
+        assert job["result"] == {"meetings": len(meetings) + 1, "anomalies": 0}  # type: ignore
+        assert test_client.get("/api/v1/jobs").json[0]["id"] == job["id"]  # type: ignore
+        assert test_client.delete(url).status_code == 409
+        assert test_client.post("/api/v1/jobs", json={"kind": "foo"}).status_code == 400
+
+    def test_archive_job(self, test_client: FlaskClient):
+        assert (
+            test_client.post("/api/v1/archive", json={"before": "x"}).status_code == 400
+        )
+        # there is no meeting before it, nothing is archived
+        res = test_client.post("/api/v1/archive", json={"before": "2000-01-01"})
+        assert res.status_code == 202 and res.json["kind"] == "archive"  # type: ignore
+        url = f"/api/v1/jobs/{res.json['id']}"  # type: ignore
+        for _ in range(500):
+            if (job := test_client.get(url).json)["status"] == "done":  # type: ignore
+                break
+            sleep(0.01)
+        assert job["result"] == {"meeting": 0, "attendance": 0, "score": 0}  # type: ignore
+
+    def test_profiler(self, test_client: FlaskClient):
+        import marshal
+
+        res = test_client.post("/api/v1/profiles", json={"endpoint": "kian.nothing"})
+        assert res.status_code == 404
+        res = test_client.post(
+            "/api/v1/profiles", json={"endpoint": "kian.get_students", "count": 1}
+        )
+        assert res.json == {"armed": {"kian.get_students": 1}}
+        test_client.get("/api/v1/students")
+        test_client.get("/api/v1/students")  # just next one is profiled
+        test_client.get("/api/v1/meetings", headers={"X-Kian-Profile": "1"})
+        res = test_client.get("/api/v1/profiles")
+        assert res.json["armed"] == {}  # type: ignore
+        profiles = res.json["profiles"]  # type: ignore
+        assert [p["endpoint"] for p in profiles] == [
+            "kian.get_meetings",
+            "kian.get_students",
+        ]
+        assert profiles[1]["queries"] > 0 and profiles[1]["status"] == 200
+        profile = test_client.get(f"/api/v1/profiles/{profiles[1]['id']}").json
+        assert "get_students" in profile["stats"]  # type: ignore
+        assert any("student" in query["sql"] for query in profile["queries"])  # type: ignore
+        res = test_client.get(f"/api/v1/profiles/{profiles[1]['id']}/download")
+        assert isinstance(marshal.loads(res.data), dict)
+        assert test_client.get("/api/v1/profiles/1000").status_code == 404
+
+    def test_import_students(self, test_client: FlaskClient):
+        csv = b"name,number\nBSimjoo,123456789\nRoya Karimi,123456793\n"
+        res = test_client.post(
+            "/api/v1/students/import",
+            data={"file": (io.BytesIO(csv), "students.csv"), "names": "A2:A3"},
+        )
+        assert res.status_code == 400
+        res = test_client.post(
+            "/api/v1/students/import",
+            data={
+                "file": (io.BytesIO(csv), "students.csv"),
+                "names": "A2:A3",
+                "numbers": "B2:B3",
+            },
+        )
+        assert res.status_code == 202
+        url = f"/api/v1/jobs/{res.json['id']}"  # type: ignore
+        for _ in range(500):
+            if (job := test_client.get(url).json)["status"] == "done":  # type: ignore
+                break
+            sleep(0.01)
+        assert job["result"] == {"students": 2, "inserted": 1}  # type: ignore
+        # files on server can't be imported (and removed) with a generic job
+        res = test_client.post(
+            "/api/v1/jobs",
+            json={"kind": "import", "params": {"path": "/no/such/file.csv"}},
+        )
+        assert res.status_code == 400 and "import" not in res.json["kinds"]  # type: ignore
+        assert not os.path.exists(job["params"]["path"])  # type: ignore
+        from cache import roster
+
+        assert roster.student("123456793").name == "Roya Karimi"  # type: ignore
+
+
+def test_create_app_in_memory():
+    import app
+
+    ephemeral = app.create_app({"database": ":memory:"})
+    ephemeral.config.update({"TESTING": True})
+    with ephemeral.test_client() as client:
+        assert client.get("/api/v1/courses").json["courses"] == ["default"]  # type: ignore
+        assert client.get("/api/v1/register?std_num=123456789").status_code == 404
+
+
+def test_read_snapshot():
+    import app
+
+    snapshotted = app.create_app(
+        {"courses": {"snapshot": ":memory:"}, "read snapshot": 60}
+    )
+    snapshotted.config.update({"TESTING": True})
+    with snapshotted.test_client() as client:
+        client.post(
+            "/api/v1/login", json={"username": "kian pirfalak", "password": "admin"}
+        )
+        assert client.get("/api/v1/students").json == []
+        course_db = snapshotted.extensions["courses"]["snapshot"]
+        with database_proxy.routed(course_db):
+            Student.create(name="BSimjoo", number="123456789")
+        assert client.get("/api/v1/students").json == []  # snapshot is not old yet
+        snapshotted.extensions["snapshots"]["snapshot"].max_age = 0
+        assert len(client.get("/api/v1/students").json) == 1  # type: ignore
+
+
+def test_profiler_signature():
+    import profiler
+    import time
+    from app import create_app
+
+    app = create_app({"database": ":memory:", "token secret": "secret"})
+    app.config.update({"TESTING": True})
+    client = app.test_client()
+    expires_at = int(time.time()) + 60
+    value = profiler.signature("secret", "/api/v1/courses", expires_at)
+    client.get("/api/v1/courses", headers={profiler.HEADER: "forged"})
+    expired = profiler.signature("secret", "/api/v1/courses", expires_at - 120)
+    client.get("/api/v1/courses", headers={profiler.HEADER: expired})
+    # expiry is signed too
+    later = value.replace(str(expires_at), str(expires_at + 3600), 1)
+    client.get("/api/v1/courses", headers={profiler.HEADER: later})
+    assert len(app.extensions["profiler"].profiles) == 0
+    client.get("/api/v1/courses", headers={profiler.HEADER: value})
+    assert len(app.extensions["profiler"].profiles) == 1
+
+    client.post(
+        "/api/v1/login", json={"username": "kian pirfalak", "password": "admin"}
+    )
+    res = client.get("/api/v1/profiles/signature?path=/api/v1/courses&minutes=5")
+    assert res.json["expires_at"] - time.time() <= 300  # type: ignore
+    assert profiler.verify("secret", res.json["value"], "/api/v1/courses")  # type: ignore
+    assert not profiler.verify("secret", res.json["value"], "/api/v1/students")  # type: ignore
+
+
+def test_checkin_tokens(tmp_path):
+    import tokens
+    from app import create_app
+    from scheduler import open_meeting
+
+    secret_file = str(tmp_path / "kian.secret")
+    config = {
+        "courses": {"tokens": ":memory:"},
+        "checkin tokens": True,
+        "secret file": secret_file,
+    }
+    # no secret key, no tokens
+    assert not create_app(config).config["checkin tokens"]
+    assert tokens.create_secret(secret_file)
+    assert not tokens.create_secret(secret_file)
+    app = create_app(config)
+    assert app.config["token secret"] == tokens.read_secret(secret_file)
+    app.config.update({"TESTING": True})
+    course_db = app.extensions["courses"]["tokens"]
+    with database_proxy.routed(course_db):
+        Student.create(name="BSimjoo", number="123456789")
+        open_meeting()
+    client = app.test_client()
+    res = client.get("/api/v1/register?std_num=123456789")
+    assert res.status_code == 200
+    cookie = next(c for c in client.cookie_jar if c.name == tokens.COOKIE)
+
+    # just the token, no session
+    stateless = app.test_client()
+    stateless.set_cookie("localhost", tokens.COOKIE, cookie.value)
+    assert stateless.get("/api/v1/attendance").status_code == 200
+    with stateless.session_transaction() as session:
+        assert "mac" not in session
+    assert stateless.get("/api/v1/whoami").json["number"] == "123456789"  # type: ignore
+
+    stateless.set_cookie("localhost", tokens.COOKIE, "x" + cookie.value)
+    assert stateless.get("/api/v1/whoami").status_code == 200  # back to session
+    with stateless.session_transaction() as session:
+        assert session["mac"] == "local"
+
+    client.post(
+        "/api/v1/login", json={"username": "kian pirfalak", "password": "admin"}
+    )
+    device_id = client.get("/api/v1/devices").json[0]["id"]  # type: ignore
+    client.post(f"/api/v1/devices/{device_id}/block", json={"blocked": True})
+    with app.app_context(), database_proxy.routed(course_db):
+        assert device_id in tokens.revoked
+    stateless.set_cookie("localhost", tokens.COOKIE, cookie.value)
+    assert stateless.get("/api/v1/attendance").status_code == 423
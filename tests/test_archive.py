@@ -0,0 +1,94 @@
+import pytest
+from model import (  # noqa:F401
+    database_proxy,
+    Student,
+    Device,
+    Attendance,
+    Score,
+    Meeting,
+    StudentSummary,
+    _TABLES_,
+)
+from archive import archive
+from playhouse.db_url import connect
+from datetime import date, time
+import os
+import stat
+
+
+@pytest.fixture()
+def live_db(tmp_path):
+    db = connect(f"sqlite:///{tmp_path / 'live.sqlite'}")
+    with database_proxy.routed(db):
+        db.connect()
+        db.create_tables(_TABLES_)
+        students = [
+            Student.create(name="BSimjoo", number="123456789"),
+            Student.create(name="Evan Alexander", number="123456790"),
+        ]
+        device = Device.create(mac="local", student=students[0])
+        for day, in_progress in ((1, False), (2, False), (20, False), (21, True)):
+            meeting = Meeting.create(
+                date=date(2022, 12, day), start_at=time(14), in_progress=in_progress
+            )
+            Attendance.create(student=students[0], device=device, meeting=meeting)
+            Score.create(student=students[1], score=2, full_score=3, meeting=meeting)
+        yield db
+        db.close()
+
+
+def test_archive(live_db, tmp_path):
+    path = str(tmp_path / "archive.sqlite")
+    result = archive(date(2022, 12, 10), path)
+    assert result == {"meeting": 2, "attendance": 2, "score": 2}
+
+    assert [m.date.day for m in Meeting.select()] == [20, 21]
+    assert Attendance.select().count() == 2 and Score.select().count() == 2
+    summaries = {s.student.name: s for s in StudentSummary.select()}
+    assert summaries["BSimjoo"].meetings == 2
+    assert summaries["BSimjoo"].attendances == 2
+    assert summaries["Evan Alexander"].attendances == 0
+    assert summaries["Evan Alexander"].total_score == 4
+    assert summaries["Evan Alexander"].total_full_score == 6
+
+    assert not os.stat(path).st_mode & stat.S_IWUSR  # read-only
+    archive_db = connect("sqlite:///" + path)
+    with database_proxy.routed(archive_db):
+        assert Meeting.select().count() == 2
+        assert Student.select().count() == 2
+        assert Attendance.select().count() == 2
+    archive_db.close()
+
+    with pytest.raises(FileExistsError):
+        archive(date(2022, 12, 10), path)
+
+
+def test_archive_accumulates_summaries(live_db, tmp_path):
+    archive(date(2022, 12, 2), str(tmp_path / "first.sqlite"))
+    archive(date(2022, 12, 21), str(tmp_path / "second.sqlite"))
+    summary = StudentSummary.get(StudentSummary.student == 2)
+    assert (summary.meetings, summary.total_score) == (3, 6)
+    assert Meeting.select().count() == 1
+
+
+def test_archive_nothing(live_db, tmp_path):
+    path = str(tmp_path / "archive.sqlite")
+    assert archive(date(2022, 1, 1), path)["meeting"] == 0
+    assert not os.path.exists(path)
+
+
+def test_archive_rows_written_meanwhile(live_db, tmp_path):
+    path = str(tmp_path / "archive.sqlite")
+    meeting = Meeting.get(Meeting.date == date(2022, 12, 1))
+
+    def progress(copied, total):
+        if copied == total:  # after copying, before live database is changed
+            with database_proxy.routed(live_db):
+                Score.create(student=1, score=1, full_score=1, meeting=meeting)
+
+    with pytest.raises(RuntimeError):
+        archive(date(2022, 12, 10), path, progress)
+    assert not os.path.exists(path)
+    assert Meeting.select().count() == 4
+    assert Score.select().count() == 5 and Attendance.select().count() == 4
+    assert not StudentSummary.select().exists()
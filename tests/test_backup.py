@@ -0,0 +1,55 @@
+import pytest
+from model import database_proxy, Student, _TABLES_
+from backup import backup, snapshots, verify
+from playhouse.db_url import connect
+import os
+
+
+@pytest.fixture()
+def live_db(tmp_path):
+    db = connect(f"sqlite:///{tmp_path / 'live.sqlite'}")
+    with database_proxy.routed(db):
+        db.connect()
+        db.create_tables(_TABLES_)
+        Student.insert_many(
+            {"name": f"student {i}", "number": f"{i:09}"} for i in range(500)
+        ).execute()
+        yield db
+        db.close()
+
+
+def test_backup(live_db, tmp_path):
+    directory = str(tmp_path / "backups")
+    steps = []
+    path = backup(
+        directory, "course", pages=2, sleep=0, progress=lambda *a: steps.append(a)
+    )
+    assert len(steps) > 1 and steps[-1][0] == steps[-1][1]
+    assert snapshots(directory, "course") == [os.path.basename(path)]
+    assert verify(path)["student"] == 500
+    assert not live_db.is_closed()  # connection of caller is not closed
+
+    directory = str(tmp_path / "rotation")
+    os.makedirs(directory)
+    for stamp in ("20221201-100000", "20221202-100000"):
+        open(os.path.join(directory, f"course-{stamp}.sqlite"), "w").close()
+    open(os.path.join(directory, "other-20221201-100000.sqlite"), "w").close()
+    # another course that its name starts with name of this course
+    open(os.path.join(directory, "course-2-20221130-100000.sqlite"), "w").close()
+    path = backup(directory, "course", keep=2, sleep=0)
+    assert snapshots(directory, "course") == [
+        os.path.basename(path),
+        "course-20221202-100000.sqlite",
+    ]
+    assert snapshots(directory, "course-2") == ["course-2-20221130-100000.sqlite"]
+    with pytest.raises(ValueError):
+        verify(os.path.join(directory, "course-20221202-100000.sqlite"))
+
+
+def test_stopped_backup(live_db, tmp_path):
+    def stop(done, total):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        backup(str(tmp_path), "course", pages=2, sleep=0, progress=stop)
+    assert os.listdir(tmp_path) == ["live.sqlite"]
@@ -0,0 +1,85 @@
+import pytest
+from model import database_proxy, Student, Device, Attendance, Meeting, Score, _TABLES_
+from peewee import SqliteDatabase
+import changes
+import migrations
+
+
+@pytest.fixture()
+def db(db):
+    # `db` of conftest.py with change log
+    migrations.migrate(db)
+    return db
+
+
+def test_changes(db):
+    assert changes.latest() == 0
+    student = Student.create(name="BSimjoo", number="123456789")
+    device = Device.create(mac="00:00:00:00:00:01", student=student)
+    meeting = Meeting.create()
+    seq = changes.latest()
+    attendance = Attendance.create(student=student, device=device, meeting=meeting)
+    score = Score.create(student=student, meeting=meeting, score=5)
+    score.score = 7
+    score.save()
+    removed = Score.create(student=student, score=1)
+    removed.delete_instance()
+
+    result = changes.since(seq)
+    assert not result["reset"]
+    assert set(result["changed"]) == {"attendance", "score"}
+    assert [a["id"] for a in result["changed"]["attendance"]] == [attendance.id]
+    # two changes of a score are compacted to its current row
+    assert [(s["id"], s["score"]) for s in result["changed"]["score"]] == [
+        (score.id, 7)
+    ]
+    assert result["deleted"] == {"score": [removed.id]}
+    assert changes.since(seq, seq) == {"reset": False, "changed": {}, "deleted": {}}
+    assert set(changes.since(0)["changed"]) == {
+        "student",
+        "device",
+        "meeting",
+        "attendance",
+        "score",
+    }
+
+    with db.atomic():  # logged in transaction of the write
+        Student.create(name="Evan Alexander", number="123456790")
+        db.rollback()
+    assert "student" not in changes.since(seq)["changed"]
+
+    seq = changes.latest()
+    changes.reset()
+    assert changes.since(seq)["reset"]
+
+
+def test_roster_sees_writes_of_other_process(tmp_path):
+    from cache import roster
+
+    path = str(tmp_path / "course.sqlite")
+    # another connection to the same file, like studmgr.py
+    db, other = SqliteDatabase(path), SqliteDatabase(path)
+    with database_proxy.routed(db):
+        db.create_tables(_TABLES_)
+        migrations.migrate(db)
+        Student.create(name="BSimjoo", number="123456789")
+        Device.create(mac="00:00:00:00:00:01")
+        roster.warm()
+        assert roster.student("123456789").id == 1  # type: ignore
+        assert not roster.device("00:00:00:00:00:01").blocked
+    with database_proxy.routed(other):
+        Student.delete().execute()
+        Student.create(name="Roya Karimi", number="123456793")
+        student = Student.create(name="BSimjoo", number="123456789")
+        Device.update(blocked=True).execute()
+        Attendance.create(student=student, device=1, meeting=Meeting.create())
+    with database_proxy.routed(db):
+        # change log is read at most once in `interval` seconds
+        assert roster.student("123456789").id == 1  # type: ignore
+        roster.get().interval = 0
+        assert roster.student("123456789").id == student.id == 2  # type: ignore
+        assert roster.device("00:00:00:00:00:01").blocked
+        # entries are kept until the next change
+        assert "123456789" in roster._students
+        # changes of other tables are skipped too
+        assert roster._seq == changes.latest()
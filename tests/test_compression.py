@@ -0,0 +1,66 @@
+from flask import Flask, g, jsonify
+import gzip
+import json
+import pytest
+import compression
+
+
+@pytest.fixture()
+def app():
+    app = Flask(__name__)
+    compression.install(app, compression.Compression(level=6, min_size=100))
+
+    @app.route("/api/large")
+    def large():
+        g.cached_response = cached
+        return app.response_class(cached["body"], mimetype="application/json")
+
+    @app.route("/api/small")
+    def small():
+        return jsonify(ok=True)
+
+    @app.route("/api/stream")
+    def stream():
+        return app.response_class(("[%d]\n" % i for i in range(100)))
+
+    @app.route("/large")
+    def page():
+        return cached["body"]
+
+    cached = {"body": json.dumps({"items": list(range(100))}).encode()}
+    app.config["cached"] = cached
+    return app
+
+
+def test_negotiation(app: Flask):
+    client = app.test_client()
+    body = app.config["cached"]["body"]
+    assert client.get("/api/large").data == body
+    res = client.get("/api/large", headers={"Accept-Encoding": "gzip, br;q=0"})
+    assert res.headers["Content-Encoding"] == "gzip"
+    assert res.headers["Vary"] == "Accept-Encoding"
+    assert gzip.decompress(res.data) == body
+    res = client.get("/api/large", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in res.headers
+    for url in ("/api/small", "/large"):  # small or not api
+        res = client.get(url, headers={"Accept-Encoding": "gzip"})
+        assert "Content-Encoding" not in res.headers
+
+
+def test_streaming(app: Flask):
+    res = app.test_client().get("/api/stream", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in res.headers
+    assert (
+        gzip.decompress(res.data) == "".join("[%d]\n" % i for i in range(100)).encode()
+    )
+
+
+def test_reuse(app: Flask):
+    client = app.test_client()
+    first = client.get("/api/large", headers={"Accept-Encoding": "gzip"}).data
+    assert ("gzip", 6) in app.config["cached"]
+    assert client.get("/api/large", headers={"Accept-Encoding": "gzip"}).data == first
+    stats = app.extensions["compression"].stats
+    assert stats["responses"] == 2 and stats["reused"] == 1
+    assert stats["ratio"] == round(stats["bytes"] / stats["compressed_bytes"], 2) > 1
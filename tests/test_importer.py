@@ -0,0 +1,45 @@
+import pytest
+from model import Student
+from importer import open_sheet, read_students, insert_students, validate_array
+from openpyxl import Workbook
+
+rows = [["name", "number"], ["BSimjoo", 123456789], ["Evan Alexander", 123456790]]
+
+
+@pytest.fixture(params=[".csv", ".xlsx"])
+def path(request, tmp_path):
+    path = str(tmp_path / f"students{request.param}")
+    if request.param == ".csv":
+        with open(path, "w") as file:
+            file.writelines(f"{name},{number}\n" for name, number in rows)
+    else:
+        wb = Workbook()
+        for row in rows:
+            wb.active.append(row)  # type: ignore
+        wb.save(path)
+    return path
+
+
+def test_read_students(path):
+    with open_sheet(path) as ws:
+        assert read_students(ws, "A2:A3", "B2:B3") == [
+            {"name": "BSimjoo", "number": "123456789"},
+            {"name": "Evan Alexander", "number": "123456790"},
+        ]
+        assert validate_array("A1:B1", ws) == (0, ["name", "number"])
+        assert validate_array("A1:B2", ws) == 1  # not a row or column
+        assert validate_array("C1:C5", ws) == 3
+        with pytest.raises(ValueError, match="numbers: count of names and numbers"):
+            read_students(ws, "A2:A3", "B1:B3")
+        with pytest.raises(ValueError, match="names: range is invalid"):
+            read_students(ws, "A2", "B2:B3")
+
+
+def test_insert_students(db):
+    Student.create(name="BSimjoo", number="123456789")
+    students = [
+        {"name": "BSimjoo", "number": "123456789"},
+        {"name": "Evan Alexander", "number": "123456790"},
+    ]
+    assert insert_students(students) == 1
+    assert Student.select().count() == 2
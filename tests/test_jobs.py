@@ -0,0 +1,66 @@
+import pytest
+import threading
+from flask import Flask
+from model import database_proxy, Job, _TABLES_
+from playhouse.db_url import connect
+import jobs
+
+release = threading.Event()
+
+
+@jobs.job("test")
+def _test_job(context: jobs.Context, steps: int = 3, fail: bool = False):
+    for step in range(steps):
+        context.progress(step, steps)
+        release.wait(5)
+    if fail:
+        raise ValueError("failed")
+    return {"steps": steps}
+
+
+@pytest.fixture()
+def runner(tmp_path):
+    db = connect(f"sqlite:///{tmp_path / 'jobs.sqlite'}")
+    runner = jobs.JobRunner(Flask(__name__), workers=1)
+    with database_proxy.routed(db):
+        db.create_tables(_TABLES_)
+        release.clear()
+        yield runner
+        release.set()
+        runner.shutdown()
+
+
+def wait(job_id, *statuses):
+    for _ in range(500):
+        if (job := Job.get_by_id(job_id)).status in statuses:
+            return job
+        threading.Event().wait(0.01)
+    raise TimeoutError
+
+
+def test_run(runner):
+    release.set()
+    job = runner.submit("test", {"steps": 2})
+    job = wait(job.id, jobs.DONE)
+    assert job.result == {"steps": 2} and job.progress == 1
+    failed = wait(runner.submit("test", {"fail": True}).id, jobs.FAILED)
+    assert failed.message == "ValueError: failed"
+    with pytest.raises(KeyError):
+        runner.submit("foo")
+
+
+def test_cancel(runner):
+    running = runner.submit("test")
+    queued = runner.submit("test")  # just one worker, so it is queued
+    wait(running.id, jobs.RUNNING)
+    assert runner.cancel(queued.id) and runner.cancel(running.id)
+    release.set()
+    assert wait(running.id, jobs.CANCELLED).finished_at is not None
+    assert Job.get_by_id(queued.id).status == jobs.CANCELLED
+    assert not runner.cancel(running.id)
+
+
+def test_recover(runner):
+    job = Job.create(kind="test", status=jobs.RUNNING)
+    jobs.recover()
+    assert Job.get_by_id(job.id).status == jobs.FAILED
@@ -0,0 +1,32 @@
+from model import Student, Score, StudentSummary
+from cache import ranks
+import leaderboard
+
+
+def test_ranking(db):
+    first = Student.create(name="BSimjoo", number="123456789")
+    second = Student.create(name="Evan Alexander", number="123456790")
+    third = Student.create(name="Adan Brady", number="123456791")
+    nobody = Student.create(name="Quinn Wiggins", number="123456792")
+    Score.create(student=first, score=3, full_score=4)
+    StudentSummary.create(student=first, total_score=4, total_full_score=10)
+    Score.create(student=second, score=5, full_score=10)
+    Score.create(student=third, score=5, full_score=5)
+
+    rows = {row["id"]: row for row in leaderboard.ranking()}
+    assert [rows[s.id]["rank"] for s in (first, second, third, nobody)] == [1, 2, 2, 4]
+    assert rows[first.id]["total_score"] == 7  # with archived scores
+    assert [rows[s.id]["normalized_rank"] for s in (first, second, third)] == [2, 2, 1]
+    assert rows[nobody.id]["normalized"] is None
+    assert rows[nobody.id]["normalized_rank"] == 4
+    assert rows[first.id]["percentile"] == 100 and rows[nobody.id]["percentile"] == 25
+    assert rows[second.id]["percentile"] == 75  # ties share percentile
+
+
+def test_cache(db):
+    student = Student.create(name="BSimjoo", number="123456789")
+    assert ranks.ranking()["id"][student.id]["total_score"] == 0
+    Score.create(student=student, score=2)
+    assert ranks.ranking()["id"][student.id]["total_score"] == 0  # cached
+    ranks.invalidate()
+    assert ranks.ranking()["id"][student.id]["total_score"] == 2
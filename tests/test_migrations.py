@@ -0,0 +1,57 @@
+from datetime import date, time
+from model import (
+    epoch,
+    Student,
+    Device,
+    Attendance,
+    Meeting,
+)
+from playhouse.migrate import SqliteMigrator, migrate as apply
+import migrations
+
+
+def test_timestamps(db):
+    student = Student.create(name="BSimjoo", number="123456789")
+    device = Device.create(mac="00:00:00:00:00:01", student=student)
+    # rows of an old version, before timestamp columns
+    meeting_id = Meeting.insert(
+        date=date(2022, 10, 1), start_at=time(23, 30), end_at=time(0, 45)
+    ).execute()
+    Attendance.insert_many(
+        [
+            {"student": student, "device": device, "meeting": meeting_id, "time": t}
+            for t in (time(23, 40), time(0, 10))
+        ]
+    ).execute()
+    migrator = SqliteMigrator(db)
+    apply(
+        migrator.drop_index("meeting", "meeting_start_timestamp"),
+        migrator.drop_column("meeting", "start_timestamp"),
+        migrator.drop_column("meeting", "end_timestamp"),
+        migrator.drop_index("attendance", "attendance_timestamp"),
+        migrator.drop_column("attendance", "timestamp"),
+    )
+
+    assert migrations.migrate(db) == ["timestamps", "change_log"]
+    assert migrations.migrate(db) == []
+    meeting = Meeting.get_by_id(meeting_id)
+    assert meeting.start_timestamp == epoch(date(2022, 10, 1), time(23, 30))
+    assert meeting.end_timestamp == epoch(date(2022, 10, 2), time(0, 45))
+    assert [a.timestamp for a in Attendance.select().order_by(Attendance.id)] == [
+        epoch(date(2022, 10, 1), time(23, 40)),
+        epoch(date(2022, 10, 2), time(0, 10)),  # after midnight
+    ]
+    assert "attendance_timestamp" in [i.name for i in db.get_indexes("attendance")]
+
+
+def test_save_sets_timestamps(db):
+    student = Student.create(name="BSimjoo", number="123456789")
+    device = Device.create(mac="00:00:00:00:00:01", student=student)
+    meeting = Meeting.create(date=date(2022, 10, 1), start_at=time(14))
+    attendance = Attendance.create(
+        student=student, device=device, meeting=meeting, time=time(14, 5)
+    )
+    assert attendance.timestamp - meeting.start_timestamp == 5 * 60
+    meeting.end_at = time(15, 30)
+    meeting.save()
+    assert meeting.end_timestamp - meeting.start_timestamp == 90 * 60
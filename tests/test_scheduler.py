@@ -0,0 +1,84 @@
+import pytest
+from datetime import date, datetime, time
+from flask import Flask
+from model import database_proxy, Meeting, Student, _TABLES_
+from peewee import SqliteDatabase
+from cache import roster
+import scheduler
+
+# 2022-10-01 is a saturday
+SATURDAY = date(2022, 10, 1)
+
+
+@pytest.fixture()
+def db(tmp_path):
+    db = SqliteDatabase(str(tmp_path / "course.sqlite"))
+    with database_proxy.routed(db):
+        db.create_tables(_TABLES_)
+        yield db
+
+
+@pytest.fixture()
+def timetable(db):
+    app = Flask(__name__)
+    app.extensions["courses"] = {"default": db}
+    slots = scheduler.parse(
+        [{"days": ["Saturday", "monday"], "start": "14:15", "end": "15:45"}],
+        app.extensions["courses"],
+    )
+    return scheduler.Scheduler(app, slots, warm_up_before=300)
+
+
+def at(hour: int, minute: int, day: date = SATURDAY) -> datetime:
+    return datetime.combine(day, time(hour, minute))
+
+
+def test_parse():
+    courses = {"default": None}
+    with pytest.raises(ValueError):
+        scheduler.parse([{"days": ["someday"], "start": "8:00"}], courses)
+    with pytest.raises(ValueError):
+        scheduler.parse([{"course": "x", "days": ["monday"]}], courses)
+    (slot,) = scheduler.parse(
+        [{"days": ["friday"], "start": "23:00", "end": "01:00"}], courses
+    )
+    assert slot.course == "default"
+    assert slot.window(SATURDAY) is None
+    assert slot.window(date(2022, 9, 30)) == (at(23, 0, date(2022, 9, 30)), at(1, 0))
+    assert slot.next_start(at(0, 0)) == at(23, 0, date(2022, 10, 7))
+
+
+def test_tick(timetable: scheduler.Scheduler, db):
+    Student.create(name="BSimjoo", number="123456789")
+    timetable.tick(at(14, 0))
+    assert roster._students == {}  # too early
+    timetable.tick(at(14, 11))
+    assert "123456789" in roster._students
+    assert not Meeting.select().exists()
+
+    timetable.tick(at(14, 15))
+    meeting = Meeting.get(Meeting.in_progress == True)  # noqa: E712
+    assert meeting.start_at == time(14, 15)
+    timetable.tick(at(14, 20))
+    assert Meeting.select().count() == 1
+
+    # admin ended it early, it is not opened again
+    scheduler.close_meeting(meeting, at(15, 0))
+    timetable.tick(at(15, 10))
+    assert Meeting.select().count() == 1
+
+    timetable.tick(at(14, 15, date(2022, 10, 2)))  # sunday
+    assert Meeting.select().count() == 1
+    timetable.tick(at(14, 30, date(2022, 10, 3)))  # late start on monday
+    meeting = Meeting.get(Meeting.in_progress == True)  # noqa: E712
+    timetable.tick(at(16, 0, date(2022, 10, 3)))
+    meeting = Meeting.get_by_id(meeting.id)
+    assert not meeting.in_progress and meeting.end_at == time(15, 45)
+
+
+def test_manual_meeting_is_kept(timetable: scheduler.Scheduler, db):
+    meeting = scheduler.open_meeting(at(12, 0))
+    timetable.tick(at(14, 15))  # a meeting is in progress
+    timetable.tick(at(16, 0))  # and it is not the scheduled one
+    assert Meeting.select().count() == 1
+    assert Meeting.get_by_id(meeting.id).in_progress
@@ -0,0 +1,40 @@
+import pytest
+from flask import Flask, session
+from model import Student, Device, Attendance, Meeting
+import scopes
+
+
+@pytest.fixture()
+def context():
+    app = Flask(__name__)
+    app.secret_key = "test"
+    with app.test_request_context():
+        yield
+
+
+def test_scopes(db, context):
+    owner = Student.create(name="BSimjoo", number="123456789")
+    other = Student.create(name="Evan Alexander", number="123456790")
+    phone = Device.create(mac="00:00:00:00:00:01", student=owner)
+    laptop = Device.create(mac="00:00:00:00:00:02", student=other)
+    meeting = Meeting.create()
+    mine = Attendance.create(student=owner, device=phone, meeting=meeting)
+    theirs = Attendance.create(student=other, device=laptop, meeting=meeting)
+
+    with pytest.raises(PermissionError):  # not registered
+        scopes.get(Device, phone.id)
+    session["student"] = owner
+    assert scopes.get(Device, phone.id)["mac"] == phone.mac  # type: ignore
+    assert scopes.get(Device, laptop.id) is None
+    assert scopes.get(Attendance, mine.id)["id"] == mine.id  # type: ignore
+    assert scopes.get(Attendance, theirs.id) is None
+    assert scopes.get(Student, other.id) is None
+    with pytest.raises(PermissionError):  # students can't read meetings
+        scopes.get(Meeting, meeting.id)
+    ids = Attendance.id.in_([mine.id, theirs.id])  # type: ignore
+    assert list(Attendance.select().where(scopes.scoped(Attendance, ids))) == [mine]
+
+    session["admin"] = True
+    assert scopes.get(Attendance, theirs.id)["id"] == theirs.id  # type: ignore
+    assert scopes.get(Meeting, meeting.id)["id"] == meeting.id  # type: ignore
+    assert scopes.get(Device, 1000) is None
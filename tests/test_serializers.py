@@ -0,0 +1,67 @@
+import pytest
+from model import (  # noqa:F401
+    Student,
+    Device,
+    Attendance,
+    Score,
+    Meeting,
+)
+from serializers import serialize, serializer_for
+from playhouse.shortcuts import model_to_dict
+from datetime import date, time
+
+
+@pytest.fixture()
+def db(db):
+    # `db` of conftest.py with data
+    students = [
+        Student.create(name="BSimjoo", number="123456789"),
+        Student.create(name="Evan Alexander", number="123456790"),
+        Student.create(name="Absent", number="123456791"),
+    ]
+    devices = [
+        Device.create(mac="local", student=students[0]),
+        Device.create(mac="00:00:00:00:00:01", student=students[1]),
+        Device.create(mac="00:00:00:00:00:02"),
+    ]
+    for day in range(1, 4):
+        meeting = Meeting.create(
+            date=date(2022, 12, day), start_at=time(14), in_progress=day == 3
+        )
+        for student, device in zip(students, devices[:2]):
+            Attendance.create(student=student, device=device, meeting=meeting)
+        Score.create(student=students[1], score=2, full_score=3, meeting=meeting)
+    Score.create(student=students[0], score=1, full_score=1, reason="bonus")
+    return db
+
+
+@pytest.mark.parametrize("model", [Student, Meeting, Attendance, Device, Score])
+def test_same_result_as_model_to_dict(db, model):
+    expected = []
+    for obj in model.select().order_by(model.id):
+        data = model_to_dict(obj, backrefs=True, max_depth=1)
+        data.update(obj.computed())
+        expected.append(data)
+    assert serialize(model) == expected
+    assert [obj.to_dict(max_depth=1) for obj in model.select()] == expected
+
+
+def test_where(db):
+    assert serialize(Meeting, Meeting.in_progress == True) == [  # noqa: E712
+        Meeting.get(Meeting.in_progress == True).to_dict(max_depth=1)  # noqa: E712
+    ]
+    assert serialize(Student, Student.number == "0") == []
+    assert serializer_for(Student) is serializer_for(Student)
+
+
+def test_fallback(db):
+    student = Student.get(Student.name == "BSimjoo")
+    data = student.to_dict(max_depth=1, exclude=[Student.scores])
+    assert "scores" not in data and data["total_score"] == 1
+    assert student.to_dict(recurse=False) == {
+        "id": student.id,
+        "name": "BSimjoo",
+        "number": "123456789",
+        "total_score": 1,
+        "total_full_score": 1,
+    }
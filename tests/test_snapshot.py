@@ -0,0 +1,29 @@
+import pytest
+from model import database_proxy, Student, _TABLES_
+from snapshot import ReadSnapshot
+from playhouse.db_url import connect
+from peewee import OperationalError
+
+
+def test_read_snapshot(tmp_path):
+    db = connect(f"sqlite:///{tmp_path / 'live.sqlite'}")
+    with database_proxy.routed(db):
+        db.create_tables(_TABLES_)
+        Student.create(name="BSimjoo", number="123456789")
+    snapshot = ReadSnapshot(max_age=60)
+    copy = snapshot.get(db)
+    assert snapshot.get(db) is copy
+
+    with database_proxy.routed(db):
+        Student.create(name="Evan Alexander", number="123456790")
+    with database_proxy.routed(copy), copy.connection_context():
+        assert Student.select().count() == 1  # not older than max age
+        with pytest.raises(OperationalError):
+            Student.create(name="Adan Brady", number="123456791")
+
+    snapshot.max_age = 0
+    fresh = snapshot.get(db)
+    assert fresh is not copy
+    with database_proxy.routed(fresh), fresh.connection_context():
+        assert Student.select().count() == 2
+    db.close()
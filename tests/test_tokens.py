@@ -0,0 +1,18 @@
+from model import Device
+import tokens
+
+
+def test_tokens():
+    device = Device(id=3, mac="00:00:00:00:00:01", student=7)
+    token = tokens.issue("secret", "default", device)
+    claims = tokens.verify("secret", token, 60)
+    assert claims is not None
+    assert (claims.course, claims.device_id, claims.student_id) == ("default", 3, 7)
+    assert claims.device().mac == device.mac and claims.device().student_id == 7
+    assert tokens.verify("other", token, 60) is None
+    assert tokens.verify("secret", token, -1) is None  # expired
+    payload, signature = token.split(".")
+    forged = tokens._encode(b"default|3|8|00:00:00:00:00:01|0")
+    assert tokens.verify("secret", f"{forged}.{signature}", 60) is None
+    assert tokens.verify("secret", "garbage", 60) is None
+    assert tokens.verify("secret", "ñ.ñ", 60) is None
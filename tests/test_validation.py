@@ -0,0 +1,62 @@
+import pytest
+from validation import Validator
+from schema import LOGIN_SCHEMA, SCORE_SCHEMA, SCORES_SCHEMA, ARCHIVE_SCHEMA
+from jsonschema import Draft7Validator
+
+instances = [
+    {},
+    [],
+    "foo",
+    None,
+    {"username": "admin", "password": "admin"},
+    {"username": 1, "password": "admin"},
+    {"student": 1, "score": 2},
+    {"student": 0, "score": 2},
+    {"student": 1.0, "score": True},
+    {"student": "1", "score": 2, "id": 0},
+    {"student": 1, "score": 2, "foo": "bar"},
+    {
+        "id": None,
+        "student": 1,
+        "score": 2.5,
+        "full_score": -1,
+        "meeting": 3,
+        "reason": None,
+    },
+    {"before": "2022-12-01"},
+    {"before": "22-12-01"},
+]
+
+
+@pytest.mark.parametrize(
+    "schema", [LOGIN_SCHEMA, SCORE_SCHEMA, SCORES_SCHEMA, ARCHIVE_SCHEMA]
+)
+def test_same_result_as_jsonschema(schema):
+    validator, reference = Validator(schema), Draft7Validator(schema)
+    for instance in instances + [[instance] for instance in instances]:
+        assert validator.is_valid(instance) == reference.is_valid(instance), instance
+
+
+def test_errors():
+    assert Validator(SCORE_SCHEMA).errors({"student": 0, "score": "1", "foo": 1}) == [
+        "$: 'foo' is not allowed",
+        "$.student: is less than 1",
+        "$.score: is not of type number",
+    ]
+    assert Validator(SCORES_SCHEMA).errors([{"student": 1, "score": 1}, {}]) == [
+        "$[1]: 'student' is a required property",
+        "$[1]: 'score' is a required property",
+    ]
+
+
+def test_errors_many():
+    errors = Validator(SCORE_SCHEMA).errors_many(
+        [{"student": 1, "score": 1}, {"student": 1}, {"student": 2, "score": 0}]
+    )
+    assert list(errors) == [1]
+
+
+def test_unsupported_keyword_fallback():
+    validator = Validator({"type": "object", "properties": {"a": {"enum": [1, 2]}}})
+    assert validator.is_valid({"a": 1})
+    assert validator.errors({"a": 3}) == ["$.a: 3 is not one of [1, 2]"]
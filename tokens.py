@@ -0,0 +1,95 @@
+# this file contains signed check-in tokens ("checkin tokens" in
+# config.json). a registered device gets a token that binds its id, mac
+# address and student, later requests of it are identified by verifying the
+# token, without reading its session or resolving its mac address. tokens of
+# blocked devices are revoked in memory. tokens are signed with a random
+# secret key that `flask --app app init-db` creates once.
+
+from __future__ import annotations
+from typing import NamedTuple
+from model import Device
+from cache import PerDatabase
+
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+
+COOKIE = "kian_token"
+
+# ids of devices whose tokens are not accepted, of each course
+revoked: set[int] = PerDatabase(set)  # type: ignore
+
+
+class Claims(NamedTuple):
+    course: str
+    device_id: int
+    student_id: int
+    mac: str
+    issued_at: int
+
+    def device(self) -> Device:
+        """Device of token, it is not read from database."""
+        return Device(id=self.device_id, mac=self.mac, student=self.student_id)
+
+
+def _encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(key: str, payload: str) -> str:
+    digest = hmac.new(key.encode(), payload.encode(), hashlib.sha256).digest()
+    return _encode(digest[:16])
+
+
+def issue(key: str, course: str, device: Device) -> str:
+    """Token of registered `device` of `course`."""
+    claims = (course, device.id, device.student_id, device.mac, int(time.time()))  # type: ignore
+    payload = _encode("|".join(map(str, claims)).encode())
+    return f"{payload}.{_sign(key, payload)}"
+
+
+def verify(key: str, token: str, max_age: float) -> Claims | None:
+    """Claims of `token` if it is signed with `key` and not older than `max_age` seconds."""
+    payload, _, signature = token.partition(".")
+    if not hmac.compare_digest(signature.encode(), _sign(key, payload).encode()):
+        return None
+    course, device_id, student_id, mac, issued_at = _decode(payload).decode().split("|")
+    claims = Claims(course, int(device_id), int(student_id), mac, int(issued_at))
+    if time.time() - claims.issued_at > max_age:
+        return None
+    return claims
+
+
+def read_secret(path: str) -> str | None:
+    """Secret key in file at `path`, `None` if it is not created."""
+    try:
+        with open(path, "r") as file:
+            return file.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def create_secret(path: str) -> bool:
+    """Create a random secret key in file at `path`, `False` if it is existed."""
+    if read_secret(path) is not None:
+        return False
+    # just readable by owner
+    with os.fdopen(
+        os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w"
+    ) as file:
+        file.write(secrets.token_hex(32))
+    return True
+
+
+def load_revoked():
+    """Revoke tokens of blocked devices of database that models are routed to."""
+    blocked = Device.select(Device.id).where(Device.blocked == True)  # noqa: E712
+    revoked.clear()
+    revoked.update(device_id for device_id, in blocked.tuples())
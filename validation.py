@@ -0,0 +1,196 @@
+# this file contains validation of json bodies that receive from client.
+# every schema is compiled once to a plain python function, so validating a
+# request doesn't walk the schema or raise exceptions for each error.
+
+from flask import request, jsonify, g
+
+import functools
+import re
+
+# keywords that compiled checkers support, schemas with other keywords are
+# validated by jsonschema.
+SUPPORTED_KEYWORDS = {
+    "type",
+    "properties",
+    "required",
+    "additionalProperties",
+    "minimum",
+    "maximum",
+    "pattern",
+    "anyOf",
+    "items",
+}
+
+TYPE_CHECKS = {
+    "object": "isinstance({0}, dict)",
+    "array": "isinstance({0}, list)",
+    "string": "isinstance({0}, str)",
+    "integer": "(isinstance({0}, int) and not isinstance({0}, bool)"
+    " or isinstance({0}, float) and {0}.is_integer())",
+    "number": "isinstance({0}, (int, float)) and not isinstance({0}, bool)",
+    "boolean": "isinstance({0}, bool)",
+    "null": "{0} is None",
+}
+
+
+class Validator:
+    """A json schema compiled to a python function."""
+
+    def __init__(self, schema: dict):
+        self.schema = schema
+        self._namespace = {"re": re}
+        self._counter = 0
+        lines = ["def check(v0):", "    errors = []"]
+        self._compile(schema, "v0", "'$'", lines, 1)
+        lines.append("    return errors")
+        self.source = "\n".join(lines)
+        exec(self.source, self._namespace)
+        self._check = self._namespace["check"]
+
+    def errors(self, instance) -> list[str]:
+        """List of errors of `instance`, empty list means it is valid."""
+        return self._check(instance)
+
+    def is_valid(self, instance) -> bool:
+        return not self._check(instance)
+
+    def errors_many(self, instances) -> dict[int, list[str]]:
+        """Errors of each invalid item of `instances` in one pass, keyed by index."""
+        check = self._check
+        result = {}
+        for index, instance in enumerate(instances):
+            if errors := check(instance):
+                result[index] = errors
+        return result
+
+    def _name(self, prefix):
+        self._counter += 1
+        return f"{prefix}{self._counter}"
+
+    def _const(self, value, prefix="c"):
+        name = self._name(prefix)
+        self._namespace[name] = value
+        return name
+
+    def _compile(self, schema: dict, var: str, path: str, lines: list, depth: int):
+        pad = "    " * depth
+        err = pad + "    errors.append({} + {!r})"
+
+        if not SUPPORTED_KEYWORDS.issuperset(schema):
+            fallback = self._const(jsonschema_errors(schema), "fallback")
+            lines.append(f"{pad}errors.extend({fallback}({var}, {path}))")
+            return
+
+        if "type" in schema:
+            types = schema["type"]
+            types = [types] if isinstance(types, str) else types
+            check = " or ".join(f"({TYPE_CHECKS[t].format(var)})" for t in types)
+            lines.append(f"{pad}if not ({check}):")
+            lines.append(err.format(path, f": is not of type {', '.join(types)}"))
+
+        if "anyOf" in schema:
+            subs = [Validator(sub)._check for sub in schema["anyOf"]]
+            subs = self._const(subs, "any_of")
+            lines.append(f"{pad}if all(sub({var}) for sub in {subs}):")
+            lines.append(err.format(path, ": is not valid under any of the schemas"))
+
+        number = TYPE_CHECKS["number"].format(var)
+        if "minimum" in schema:
+            lines.append(f"{pad}if {number} and {var} < {schema['minimum']!r}:")
+            lines.append(err.format(path, f": is less than {schema['minimum']}"))
+        if "maximum" in schema:
+            lines.append(f"{pad}if {number} and {var} > {schema['maximum']!r}:")
+            lines.append(err.format(path, f": is greater than {schema['maximum']}"))
+
+        if "pattern" in schema:
+            regex = self._const(re.compile(schema["pattern"]), "regex")
+            lines.append(
+                f"{pad}if isinstance({var}, str) and {regex}.search({var}) is None:"
+            )
+            lines.append(err.format(path, f": does not match {schema['pattern']!r}"))
+
+        if "items" in schema:
+            index, item = self._name("i"), self._name("v")
+            lines.append(f"{pad}if isinstance({var}, list):")
+            lines.append(f"{pad}    for {index}, {item} in enumerate({var}):")
+            self._compile(
+                schema["items"], item, f"{path} + f'[{{{index}}}]'", lines, depth + 2
+            )
+
+        properties = schema.get("properties", {})
+        required = schema.get("required", ())
+        additional = schema.get("additionalProperties", True) is False
+        if properties or required or additional:
+            lines.append(f"{pad}if isinstance({var}, dict):")
+            for key in required:
+                lines.append(f"{pad}    if {key!r} not in {var}:")
+                lines.append(
+                    "    " + err.format(path, f": {key!r} is a required property")
+                )
+            if additional:
+                known = self._const(frozenset(properties), "known")
+                key = self._name("k")
+                lines.append(f"{pad}    for {key} in {var}:")
+                lines.append(f"{pad}        if {key} not in {known}:")
+                lines.append(
+                    f"{pad}            errors.append({path} + f': {{{key}!r}} is not allowed')"
+                )
+            for key, sub in properties.items():
+                value = self._name("v")
+                lines.append(f"{pad}    if {key!r} in {var}:")
+                lines.append(f"{pad}        {value} = {var}[{key!r}]")
+                self._compile(sub, value, f"{path} + {'.' + key!r}", lines, depth + 2)
+
+
+def jsonschema_errors(schema: dict):
+    """Errors function of `schema` that uses jsonschema."""
+    from jsonschema.validators import validator_for
+
+    cls = validator_for(schema)
+    cls.check_schema(schema)
+    validator = cls(schema)
+
+    def errors(instance, path="$"):
+        return [
+            "".join(
+                [path, *(f".{p}" for p in error.absolute_path), ": ", error.message]
+            )
+            for error in validator.iter_errors(instance)
+        ]
+
+    return errors
+
+
+_validators: dict[int, Validator] = {}
+
+
+def get_validator(schema: dict) -> Validator:
+    if (validator := _validators.get(id(schema))) is None:
+        validator = _validators[id(schema)] = Validator(schema)
+    return validator
+
+
+def compile_schemas(module):
+    """Compile all schemas (`*_SCHEMA` names) of `module`."""
+    for name in dir(module):
+        if name.endswith("_SCHEMA"):
+            get_validator(getattr(module, name))
+
+
+def expects_json(schema: dict):
+    """Validate json body of request with `schema` and put it in `g.data`."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kw):
+            data = request.get_json(silent=True)
+            if data is None:
+                return jsonify(errors=["$: request body must be json"]), 400
+            if errors := get_validator(schema).errors(data):
+                return jsonify(errors=errors), 400
+            g.data = data
+            return func(*args, **kw)
+
+        return wrapper
+
+    return decorator